@@ -2,6 +2,19 @@
 Configuration pour le worker de scraping d'images
 """
 
+import platform
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Mapping, Optional, Tuple
+
+# multidict (dépendance d'aiohttp) permet de pré-construire des headers déjà normalisés
+try:
+    from multidict import CIMultiDict, CIMultiDictProxy
+    HAS_MULTIDICT = True
+except ImportError:
+    HAS_MULTIDICT = False
+
 # Configuration par défaut du scraper
 DEFAULT_CONFIG = {
     # URL du site à scraper (à modifier)
@@ -10,18 +23,57 @@ DEFAULT_CONFIG = {
     # Répertoire de sortie pour les images
     "output_dir": "scraped_images",
     
-    # Nombre maximum de requêtes simultanées
-    "max_concurrent": 15,
+    # Nombre maximum de requêtes simultanées (global puis par hôte)
+    "max_concurrent_total": 15,
+    "max_concurrent_per_host": 8,
+    
+    # Requête de secours (hedging) si la première n'a pas répondu après ce délai (ms)
+    "hedge_after_ms": 500,
+    
+    # Nombre maximal de requêtes en vol pour une même URL (1 = pas de hedging, défaut:
+    # un seuil fixe est trop bas pour les pages Google Sites et doublerait les requêtes)
+    "hedge_cap": 1,
     
     # Nombre maximum de pages à crawler
     "max_pages": 1000,
     
-    # Délai entre les requêtes (en secondes) - réduire pour plus de vitesse
+    # Délai entre les requêtes (en secondes) - plancher du limiteur pour un hôte en backoff
     "delay_between_requests": 0.05,
     
+    # Limiteur de débit adaptatif par hôte (token bucket, voir rate_limiter.py)
+    "rate_limit": {
+        "initial_tokens": 1,
+        "max_tokens": 32,
+        "ramp_factor": 1.5,
+        "backoff_on_error_rate": 0.1,
+        "backoff_window_s": 60,
+        "ttfb_degradation_threshold": 1.5,
+        "max_consecutive_failures": 50,
+    },
+    
+    # Respecter le Crawl-delay déclaré dans robots.txt
+    "crawl_delay_respect_robots": True,
+    
     # Timeout pour les requêtes HTTP
     "timeout": 30,
     
+    # Taille du pool de connexions HTTP (keep-alive) - None = aligné sur max_concurrent_total
+    "pool_maxsize": None,
+    
+    # Durée de conservation des connexions inactives (en secondes)
+    "keepalive_timeout": 30,
+    
+    # Cache DNS du client HTTP (en secondes)
+    "dns_cache_ttl": 300,
+    
+    # Téléchargement des images par morceaux (mémoire bornée par requête en vol)
+    "stream_downloads": True,
+    "chunk_size": 65536,
+    "max_image_bytes": 15 * 1024 * 1024,
+    
+    # Boucle d'événements: 'auto' (uvloop si disponible), 'io_uring' ou 'epoll' (asyncio standard)
+    "io_backend": "auto",
+    
     # Extensions d'images à rechercher
     "image_extensions": ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg'],
     
@@ -30,40 +82,164 @@ DEFAULT_CONFIG = {
     
     # Headers HTTP pour simuler un navigateur
     "user_agents": [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     ]
 }
 
 # Configurations prédéfinies pour différents types de sites
 SITE_CONFIGS = {
     "ecommerce": {
-        "max_concurrent": 20,
+        "max_concurrent_total": 20,
+        "max_concurrent_per_host": 8,
         "delay_between_requests": 0.1,
         "max_pages": 2000,
     },
     
     "blog": {
-        "max_concurrent": 10,
+        "max_concurrent_total": 10,
+        "max_concurrent_per_host": 4,
         "delay_between_requests": 0.2,
         "max_pages": 500,
     },
     
     "gallery": {
-        "max_concurrent": 25,
+        "max_concurrent_total": 25,
+        "max_concurrent_per_host": 8,
         "delay_between_requests": 0.05,
         "max_pages": 1500,
     },
     
     "social": {
-        "max_concurrent": 30,
+        "max_concurrent_total": 200,
+        "max_concurrent_per_host": 8,
         "delay_between_requests": 0.02,
         "max_pages": 3000,
     }
 }
 
-def get_config(site_type: str = "default") -> dict:
+# Classification des URLs par extension en un seul passage regex
+_EXT_KIND = {
+    **{ext.lstrip('.'): "ignore" for ext in DEFAULT_CONFIG["ignore_extensions"]},
+    **{ext.lstrip('.'): "image" for ext in DEFAULT_CONFIG["image_extensions"]},
+}
+_EXT_RE = re.compile(
+    r'\.(' + '|'.join(sorted(map(re.escape, _EXT_KIND), key=len, reverse=True)) + r')(?:[?#]|$)',
+    re.IGNORECASE
+)
+
+def classify_url(url: str) -> str:
+    """
+    Classe une URL selon son extension
+    
+    Args:
+        url: URL à classer
+    
+    Returns:
+        str: 'image', 'ignore' ou 'page'
+    """
+    match = _EXT_RE.search(url)
+    return _EXT_KIND[match.group(1).lower()] if match else "page"
+
+def _pad_pow2(items) -> tuple:
+    """Complète un tuple à une puissance de 2 (répétition) pour une rotation par masque"""
+    size = 1 << (len(items) - 1).bit_length()
+    return tuple(items[i % len(items)] for i in range(size))
+
+# Headers HTTP construits une seule fois par User-Agent
+_BASE_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "DNT": "1",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+def _build_headers(user_agents) -> Tuple[Mapping[str, str], ...]:
+    """Construit un jeu de headers immuable par User-Agent"""
+    headers = ({"User-Agent": ua, **_BASE_HEADERS} for ua in user_agents)
+    if HAS_MULTIDICT:
+        return tuple(CIMultiDictProxy(CIMultiDict(h)) for h in headers)
+    return tuple(headers)
+
+@dataclass(slots=True, frozen=True)
+class RateLimitConfig:
+    """Paramètres du limiteur de débit adaptatif (voir rate_limiter.py)"""
+    initial_tokens: float
+    max_tokens: float
+    ramp_factor: float
+    backoff_on_error_rate: float
+    backoff_window_s: float
+    ttfb_degradation_threshold: float
+    max_consecutive_failures: int
+
+@dataclass(slots=True, frozen=True)
+class ScraperConfig:
+    """Configuration validée et immuable du scraper (accès par attribut)"""
+    base_url: str
+    output_dir: str
+    max_concurrent_total: int
+    max_concurrent_per_host: int
+    hedge_after_ms: int
+    hedge_cap: int
+    max_pages: int
+    delay_between_requests: float
+    rate_limit: RateLimitConfig
+    crawl_delay_respect_robots: bool
+    timeout: int
+    pool_maxsize: Optional[int]
+    keepalive_timeout: int
+    dns_cache_ttl: int
+    stream_downloads: bool
+    chunk_size: int
+    max_image_bytes: int
+    io_backend: str
+    image_extensions: Tuple[str, ...]
+    ignore_extensions: Tuple[str, ...]
+    user_agents: Tuple[str, ...]
+    
+    # Valeurs dérivées, calculées à la construction
+    image_ext_set: frozenset = field(init=False)
+    ignore_ext_set: frozenset = field(init=False)
+    ext_classifier: Callable[[str], str] = field(init=False)
+    prebuilt_headers: Tuple[Mapping[str, str], ...] = field(init=False, compare=False, hash=False)
+    headers_mask: int = field(init=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'image_ext_set', frozenset(self.image_extensions))
+        object.__setattr__(self, 'ignore_ext_set', frozenset(self.ignore_extensions))
+        object.__setattr__(self, 'ext_classifier', classify_url)
+        # Un jeu de headers par User-Agent, complété à une puissance de 2 pour un index par masque
+        object.__setattr__(self, 'prebuilt_headers', _build_headers(_pad_pow2(self.user_agents)))
+        object.__setattr__(self, 'headers_mask', len(self.prebuilt_headers) - 1)
+    
+    def headers_for(self, counter: int) -> Mapping[str, str]:
+        """
+        Retourne les headers pré-construits associés à un compteur de requêtes
+        
+        Args:
+            counter: Compteur monotone (ex: next(itertools.count()) par worker)
+        
+        Returns:
+            Mapping[str, str]: Headers HTTP à ne pas modifier
+        """
+        return self.prebuilt_headers[counter & self.headers_mask]
+
+def _build_config(overrides: dict) -> ScraperConfig:
+    """Fusionne une surcharge avec DEFAULT_CONFIG et construit la configuration immuable"""
+    merged = {**DEFAULT_CONFIG, **overrides}
+    merged["rate_limit"] = RateLimitConfig(**merged["rate_limit"])
+    for key in ("image_extensions", "ignore_extensions", "user_agents"):
+        merged[key] = tuple(merged[key])
+    return ScraperConfig(**merged)
+
+# Configurations fusionnées et validées une seule fois à l'import
+_RESOLVED = {name: _build_config(overrides) for name, overrides in SITE_CONFIGS.items()}
+_RESOLVED["default"] = _build_config({})
+
+def get_config(site_type: str = "default") -> ScraperConfig:
     """
     Retourne la configuration pour un type de site donné
     
@@ -71,11 +247,64 @@ def get_config(site_type: str = "default") -> dict:
         site_type: Type de site ('default', 'ecommerce', 'blog', 'gallery', 'social')
     
     Returns:
-        dict: Configuration fusionnée
+        ScraperConfig: Configuration fusionnée, immuable et hashable
+        (utiliser dataclasses.replace(get_config(...), ...) pour la modifier)
     """
-    config = DEFAULT_CONFIG.copy()
+    return _RESOLVED.get(site_type, _RESOLVED["default"])
+
+def create_connector(config=None, limit: Optional[int] = None, ssl: bool = True):
+    """
+    Construit un aiohttp.TCPConnector à partir de la configuration
+    
+    Args:
+        config: Configuration retournée par get_config (défaut si None)
+        limit: Nombre total de connexions (défaut: pool_maxsize puis max_concurrent_total)
+        ssl: False pour désactiver la vérification des certificats
+    
+    Returns:
+        aiohttp.TCPConnector: Connecteur avec pool keep-alive et cache DNS
+    """
+    import aiohttp
+    
+    config = config or get_config()
+    return aiohttp.TCPConnector(
+        limit=limit or config.pool_maxsize or config.max_concurrent_total,
+        limit_per_host=config.max_concurrent_per_host,
+        keepalive_timeout=config.keepalive_timeout,
+        ttl_dns_cache=config.dns_cache_ttl,
+        ssl=ssl
+    )
+
+def _kernel_version() -> tuple:
+    """Retourne la version (majeure, mineure) du noyau Linux, (0, 0) si inconnue"""
+    match = re.match(r'(\d+)\.(\d+)', platform.release())
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+def install_event_loop_policy(io_backend: str = "auto") -> str:
+    """
+    Sélectionne la boucle d'événements asyncio selon le backend demandé
+    
+    uvloop (libuv) est utilisé pour 'auto' et 'io_uring'; sur Linux >= 5.6,
+    libuv s'appuie sur io_uring pour ses opérations fichiers. Retombe sur la
+    boucle asyncio standard (epoll) si uvloop est absent ou le noyau trop ancien.
+    
+    Args:
+        io_backend: 'auto', 'io_uring' ou 'epoll'
+    
+    Returns:
+        str: Nom du backend effectivement installé ('uvloop' ou 'asyncio')
+    """
+    if io_backend == "epoll" or sys.platform == "win32":
+        return "asyncio"
+    
+    if io_backend == "io_uring" and (sys.platform != "linux" or _kernel_version() < (5, 6)):
+        return "asyncio"
     
-    if site_type in SITE_CONFIGS:
-        config.update(SITE_CONFIGS[site_type])
+    try:
+        import asyncio
+        import uvloop
+    except ImportError:
+        return "asyncio"
     
-    return config 
\ No newline at end of file
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
@@ -6,18 +6,29 @@ Navigue automatiquement dans toutes les pages de la navbar pour extraire les ima
 
 import asyncio
 import aiohttp
-import aiofiles
+import base64
+import dataclasses
+import functools
 import os
 import re
+import shutil
 import logging
-from urllib.parse import urljoin, urlparse, unquote
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
 from pathlib import Path
-from typing import Set, List, Dict, Optional, Tuple
-from bs4 import BeautifulSoup
+from typing import Set, List, Dict, Mapping, Optional, Tuple, Union
+import lxml.html
+from yarl import URL
+from lxml import etree
 import time
 from tqdm.asyncio import tqdm
 import io
 import hashlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from config import create_connector, get_config, install_event_loop_policy
+from rate_limiter import HostRateLimiter
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,15 +40,78 @@ try:
     HAS_PILLOW = True
 except ImportError:
     HAS_PILLOW = False
-    logger.warning("Pillow non disponible - validation d'images désactivée")
 
-# Détection du parser disponible
+# imagesize (pur Python) lit les dimensions dans l'en-tête sans préparer de décodeur
+try:
+    import imagesize
+    HAS_IMAGESIZE = True
+except ImportError:
+    HAS_IMAGESIZE = False
+
+if not (HAS_PILLOW or HAS_IMAGESIZE):
+    logger.warning("Ni imagesize ni Pillow disponibles - validation d'images désactivée")
+
 try:
-    import lxml
-    HTML_PARSER = 'lxml'
+    import blake3
+    HAS_BLAKE3 = True
 except ImportError:
-    HTML_PARSER = 'html.parser'
-    logger.warning("lxml non disponible - utilisation de html.parser (plus lent)")
+    HAS_BLAKE3 = False
+
+def new_content_hasher():
+    """Crée un hasher incrémental (BLAKE3, sinon BLAKE2b)"""
+    if HAS_BLAKE3:
+        return blake3.blake3()
+    return hashlib.blake2b(digest_size=16)
+
+def hasher_digest(hasher) -> bytes:
+    """Retourne l'empreinte 16 octets d'un hasher créé par new_content_hasher"""
+    if HAS_BLAKE3:
+        return hasher.digest(length=16)
+    return hasher.digest()
+
+def hash_content(content: bytes) -> bytes:
+    """Empreinte 16 octets du contenu pour la détection de doublons"""
+    hasher = new_content_hasher()
+    hasher.update(content)
+    return hasher_digest(hasher)
+
+def _probe_dims(content: bytes) -> Tuple[int, int]:
+    """
+    Lit les dimensions d'une image (appelée dans un pool de threads)
+    
+    imagesize ne lit que l'en-tête du fichier; Pillow sert de repli pour les formats
+    qu'il ne reconnaît pas.
+    
+    Returns:
+        Tuple[int, int]: (largeur, hauteur)
+    
+    Raises:
+        ValueError: si le contenu n'est pas une image reconnue
+    """
+    if HAS_IMAGESIZE:
+        width, height = imagesize.get(io.BytesIO(content))
+        if width > 0 and height > 0:
+            return width, height
+    if HAS_PILLOW:
+        return Image.open(io.BytesIO(content)).size
+    raise ValueError("format d'image non reconnu")
+
+@functools.lru_cache(maxsize=100_000)
+def _matches_url_pattern(url: str, pattern: re.Pattern) -> bool:
+    """Test d'appartenance d'une URL mis en cache (les liens de navbar reviennent sur chaque page)"""
+    return pattern.search(url) is not None
+
+def _sync_write(path, data: bytes):
+    """Écrit un fichier d'un seul coup (appelée via asyncio.to_thread)"""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def hash_suffix(digest: bytes) -> str:
+    """Suffixe court (8 caractères base64 urlsafe, 48 bits) dérivé d'une empreinte"""
+    return base64.urlsafe_b64encode(digest[:6]).decode('ascii')
+
+# Namespace EXSLT pour les expressions régulières dans les requêtes XPath
+XPATH_NAMESPACES = {'re': 'http://exslt.org/regular-expressions'}
 
 class FlashBackScraper:
     def __init__(self, 
@@ -45,28 +119,41 @@ class FlashBackScraper:
                  output_dir: str = "flashback_images",
                  max_concurrent: int = 8,  # Plus conservateur pour Google Sites
                  delay_between_requests: float = 0.5,  # Plus respectueux
-                 timeout: int = 45):
+                 timeout: int = 45,
+                 site_type: str = "default",
+                 image_queue: Optional[asyncio.Queue] = None,
+                 session: Optional[aiohttp.ClientSession] = None):
         """
         Scraper spécialisé pour FlashBack FA
         
         Args:
             base_url: URL de départ du site FlashBack FA
             output_dir: Répertoire où sauvegarder les images
-            max_concurrent: Nombre de requêtes simultanées max
-            delay_between_requests: Délai entre les requêtes (secondes)
+            max_concurrent: Nombre de requêtes simultanées max (tous hôtes confondus)
+            delay_between_requests: Délai minimal entre deux requêtes vers un hôte en backoff
+                (appliqué seulement après un 429/5xx/timeout récent, en secondes)
             timeout: Timeout des requêtes HTTP
+            site_type: Profil de configuration (voir config.py) pour les réglages réseau
+            image_queue: File où publier le chemin de chaque image sauvegardée (consommateur: l'extracteur IA)
+            session: Session aiohttp partagée (fournie et fermée par l'appelant); sinon une session propre est créée
         """
         self.base_url = base_url
         self.output_dir = Path(output_dir)
         self.max_concurrent = max_concurrent
         self.delay_between_requests = delay_between_requests
         self.timeout = timeout
+        self.config = get_config(site_type)
+        self.image_queue = image_queue
         
         # Créer le répertoire de sortie
         self.output_dir.mkdir(exist_ok=True)
         
-        # Session aiohttp
-        self.session = None
+        # Session aiohttp (partagée si fournie: timeout passé alors à chaque requête)
+        self.session = session
+        self._owns_session = session is None
+        
+        # Pool de lecture des dimensions d'images (créé dans __aenter__)
+        self._exec: Optional[ThreadPoolExecutor] = None
         
         # Statistiques
         self.stats = {
@@ -78,30 +165,49 @@ class FlashBackScraper:
             'size_filtered': 0
         }
         
-        # Tracking des doublons par contenu d'image
-        self.image_hashes = set()
-        
-        # Headers pour simuler un navigateur réel (important pour Google Sites)
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        # Tracking des doublons par contenu d'image (empreinte complète)
+        self.image_hashes: Set[bytes] = set()
+        
+        # Headers de navigateur pré-construits dans config.py, User-Agent en rotation à chaque requête
+        self._request_counter = itertools.count()
         
         # Sets pour éviter les doublons
         self.visited_urls: Set[str] = set()
         self.found_images: Set[str] = set()
         self.navbar_pages: Set[str] = set()
         
-        # Semaphore pour contrôler la concurrence
+        # Semaphores pour contrôler la concurrence (global + un par hôte)
         self.semaphore = asyncio.Semaphore(max_concurrent)
+        # Les images sont plus lourdes que les pages: timeout doublé pour les téléchargements
+        self.page_timeout = aiohttp.ClientTimeout(total=timeout)
+        self.download_timeout = aiohttp.ClientTimeout(total=timeout * 2)
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        
+        # Limiteur de débit adaptatif par hôte (le délai sert de plancher)
+        self.rate_limiter = HostRateLimiter(
+            min_interval=delay_between_requests,
+            **dataclasses.asdict(self.config.rate_limit)
+        )
+        self._robots_checked: Set[str] = set()
+        self._robots_lock = asyncio.Lock()
+        
+        # Sections à ignorer (header/banner/catalogue), sélectionnées en une seule requête XPath
+        self._ignored_sections_xpath = etree.XPath(
+            "//*[(self::header or self::div) and re:test(@class, 'header|banner|hero|cover', 'i')]"
+            " | //*[re:test(@class, 'catalogue', 'i') or re:test(@id, 'catalogue', 'i')]",
+            namespaces=XPATH_NAMESPACES
+        )
         
-        # Parser HTML à utiliser
-        self.html_parser = HTML_PARSER
+        # Regex du contexte des divs et des images CSS compilées une seule fois
+        self._div_bg_context_re = re.compile(r'header|banner|hero|cover|background.*large|bg.*main', re.I)
+        self._parent_context_re = re.compile(r'header|banner|hero|cover|catalogue', re.I)
+        self._background_url_re = re.compile(r'background(?:-image)?:\s*url\(["\']?(.*?)["\']?\)')
+        self._background_divs_xpath = etree.XPath(
+            r"//div[re:test(@style, 'background(-image)?:\s*url\(')]",
+            namespaces=XPATH_NAMESPACES
+        )
+        # Candidats d'un srcset: URL suivie d'un descripteur optionnel (largeur "w" ou densité "x")
+        self._srcset_re = re.compile(r'([^\s,]+)(?:\s+(\d+(?:\.\d+)?)[wx])?')
         
         # Patterns spécifiques pour détecter les pages FlashBack FA
         self.flashback_patterns = [
@@ -110,49 +216,77 @@ class FlashBackScraper:
             r'/view/',
             r'sites\.google\.com'
         ]
+        
+        # Regex combinées (une alternation par usage) compilées une seule fois
+        self._flashback_re = re.compile('|'.join(self.flashback_patterns), re.I)
+        self._skip_re = re.compile(r'catalogue.*illegal|header.*background|banner.*main|wallpaper|backdrop', re.I)
+        self._skip_context_re = re.compile(r'main.*header|hero.*banner|cover.*background', re.I)
+        # Classification par extension ('image', 'ignore', 'page') partagée avec config.py
+        self._classify_url = self.config.ext_classifier
+        self._unsafe_filename_re = re.compile(r'[<>:"/\\|?*]')
+        
+        # Liens de la navbar filtrés directement par libxml2 (une requête XPath par critère)
+        nav_keywords = (
+            'reglement|savoir|aide|discord|services|gouvernement|ems|pompier|police|army'
+            '|illegal|gang|orga|petite|frappe|independant|entreprise'
+        )
+        self._nav_links_xpath = etree.XPath(
+            f"//a[re:test(@href, '{nav_keywords}', 'i')]/@href",
+            namespaces=XPATH_NAMESPACES
+        )
+        self._view_links_xpath = etree.XPath(
+            "//a[contains(@href, 'view/') and contains(@href, 'reglement-flashback-fa')"
+            " and not(re:test(@href, 'catalogue', 'i'))]/@href",
+            namespaces=XPATH_NAMESPACES
+        )
 
     async def __aenter__(self):
         """Context manager pour gérer la session aiohttp"""
-        connector = aiohttp.TCPConnector(
-            limit=self.max_concurrent, 
-            limit_per_host=self.max_concurrent,
+        # Pool dédié à la lecture des dimensions d'images, hors de la boucle d'événements
+        self._exec = ThreadPoolExecutor(max_workers=os.cpu_count())
+        
+        if not self._owns_session:
+            return self
+        
+        connector = create_connector(
+            self.config,
+            limit=self.max_concurrent,
             ssl=False  # Pour éviter les problèmes SSL avec Google Sites
         )
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
         self.session = aiohttp.ClientSession(
             connector=connector,
-            timeout=timeout,
-            headers=self.headers
+            timeout=self.page_timeout
         )
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Fermeture propre de la session"""
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+        if self._exec:
+            self._exec.shutdown(wait=False)
+            self._exec = None
+
+    def next_headers(self) -> Mapping[str, str]:
+        """Headers de la prochaine requête (jeu pré-construit, User-Agent en rotation)"""
+        return self.config.headers_for(next(self._request_counter))
 
     def is_flashback_url(self, url: str) -> bool:
         """Vérifie si l'URL appartient au site FlashBack FA"""
-        try:
-            for pattern in self.flashback_patterns:
-                if re.search(pattern, url, re.IGNORECASE):
-                    return True
-            return False
-        except Exception:
-            return False
+        return _matches_url_pattern(url, self._flashback_re)
 
-    def normalize_url(self, url: str, base_url: str) -> Optional[str]:
-        """Normalise une URL relative ou absolue"""
+    def normalize_url(self, url: str, base_url: Union[str, URL]) -> Optional[str]:
+        """Normalise une URL relative ou absolue (base_url peut être une URL yarl déjà analysée)"""
         try:
-            # Joindre l'URL relative à l'URL de base
-            full_url = urljoin(base_url, url)
+            base = base_url if isinstance(base_url, URL) else URL(base_url)
             
-            # Supprimer les fragments (#) mais garder les paramètres
-            if '#' in full_url:
-                full_url = full_url.split('#')[0]
+            # Joindre à l'URL de base, supprimer les fragments (#) mais garder les paramètres,
+            # puis décoder l'URL
+            full_url = base.join(URL(url)).with_fragment(None).human_repr()
             
-            # Décoder l'URL
-            full_url = unquote(full_url)
+            # Ne crawler que des pages (ni images ni documents/archives)
+            if self._classify_url(full_url) != "page":
+                return None
             
             return full_url if self.is_flashback_url(full_url) else None
         except Exception:
@@ -160,25 +294,15 @@ class FlashBackScraper:
 
     def should_skip_image(self, image_url: str, context: str = "") -> bool:
         """Détermine si une image doit être ignorée"""
-        # URLs à ignorer (réduit aux plus importants)
-        skip_patterns = [
-            r'catalogue.*illegal',  # Plus spécifique
-            r'header.*background',  # Plus spécifique
-            r'banner.*main',        # Plus spécifique
-            r'wallpaper',
-            r'backdrop'
-        ]
-        
-        # Vérifier les patterns dans l'URL
-        for pattern in skip_patterns:
-            if re.search(pattern, image_url, re.IGNORECASE):
-                logger.debug(f"Image ignorée (pattern URL): {image_url}")
-                return True
+        # Vérifier les patterns dans l'URL (catalogue illégal, header, banner, wallpaper...)
+        if self._skip_re.search(image_url):
+            logger.debug(f"Image ignorée (pattern URL): {image_url}")
+            return True
         
         # Vérifier les patterns dans le contexte (plus spécifique)
         if context:
             # Seulement ignorer si c'est clairement un header/banner principal
-            if re.search(r'main.*header|hero.*banner|cover.*background', context, re.IGNORECASE):
+            if self._skip_context_re.search(context):
                 logger.debug(f"Image ignorée (pattern contexte): {image_url}")
                 return True
         
@@ -189,166 +313,153 @@ class FlashBackScraper:
         navbar_urls = set()
         
         try:
-            soup = BeautifulSoup(html_content, self.html_parser)
-            
-            # Chercher dans la navigation principale
-            nav_elements = soup.find_all(['nav', 'ul', 'div'], class_=re.compile(r'nav|menu|header', re.I))
-            
-            # Aussi chercher tous les liens qui pourraient être dans la navbar
-            all_links = soup.find_all('a', href=True)
+            tree = lxml.html.fromstring(html_content)
+            base = URL(page_url)
             
-            for link in all_links:
-                href = link.get('href', '')
-                if href:
-                    normalized_url = self.normalize_url(href, page_url)
-                    if normalized_url and normalized_url not in self.visited_urls:
-                        # EXCLURE spécifiquement les pages catalogue
-                        if 'catalogue' in href.lower():
-                            logger.info(f"Page catalogue ignorée: {normalized_url}")
-                            continue
-                            
-                        # Vérifier si c'est un lien de navigation interne
-                        if any(keyword in href.lower() for keyword in [
-                            'reglement', 'savoir', 'aide', 'discord', 'services', 'gouvernement', 
-                            'ems', 'pompier', 'police', 'army', 'illegal', 
-                            'gang', 'orga', 'petite', 'frappe', 'independant', 'entreprise'
-                        ]):
-                            navbar_urls.add(normalized_url)
-                            logger.info(f"Page de navigation trouvée: {normalized_url}")
-            
-            # Aussi chercher des patterns spécifiques dans les URLs
-            for link in all_links:
-                href = link.get('href', '')
-                if href and 'view/' in href and 'reglement-flashback-fa' in href:
-                    # EXCLURE les catalogues
+            # Liens de navigation interne (mots-clés de la navbar)
+            for href in self._nav_links_xpath(tree):
+                normalized_url = self.normalize_url(href, base)
+                if normalized_url and normalized_url not in self.visited_urls:
+                    # EXCLURE spécifiquement les pages catalogue
                     if 'catalogue' in href.lower():
+                        logger.info(f"Page catalogue ignorée: {normalized_url}")
                         continue
-                        
-                    normalized_url = self.normalize_url(href, page_url)
-                    if normalized_url:
-                        navbar_urls.add(normalized_url)
-                        logger.info(f"Page FlashBack trouvée: {normalized_url}")
-                        
+                    
+                    navbar_urls.add(normalized_url)
+                    logger.info(f"Page de navigation trouvée: {normalized_url}")
+            
+            # Aussi chercher des patterns spécifiques dans les URLs (catalogues exclus par l'XPath)
+            for href in self._view_links_xpath(tree):
+                normalized_url = self.normalize_url(href, base)
+                if normalized_url:
+                    navbar_urls.add(normalized_url)
+                    logger.info(f"Page FlashBack trouvée: {normalized_url}")
+                    
         except Exception as e:
             logger.error(f"Erreur lors de l'extraction de la navbar depuis {page_url}: {e}")
         
         return navbar_urls
 
+    def _under_banner(self, node, cache: Dict) -> bool:
+        """
+        Indique si un nœud ou l'un de ses ancêtres est un header/banner/hero/cover/catalogue
+        
+        Le drapeau est propagé de haut en bas: chaque élément n'est testé qu'une fois par page.
+        
+        Args:
+            node: Élément lxml (ou None)
+            cache: Drapeaux déjà calculés, partagés entre les images d'une même page
+        
+        Returns:
+            bool: True si le nœud est sous une section à ignorer
+        """
+        pending = []
+        while node is not None and node not in cache:
+            pending.append(node)
+            node = node.getparent()
+        
+        flag = cache[node] if node is not None else False
+        for element in reversed(pending):
+            flag = flag or self._parent_context_re.search(
+                f"{element.tag} {element.get('class', '')} {element.get('id', '')}"
+            ) is not None
+            cache[element] = flag
+        return flag
+
     def extract_image_urls_from_html(self, html_content: str, page_url: str) -> Set[str]:
         """Extrait toutes les URLs d'images depuis le contenu HTML, spécialement dans les divs"""
         image_urls = set()
         
         try:
-            soup = BeautifulSoup(html_content, self.html_parser)
+            tree = lxml.html.fromstring(html_content)
+            base = URL(page_url)
             
-            # IGNORER les sections header/banner
-            for header in soup.find_all(['header', 'div'], class_=re.compile(r'header|banner|hero|cover', re.I)):
-                header.decompose()
+            # IGNORER les sections header/banner et celles avec "catalogue" dans les attributs
+            for section in self._ignored_sections_xpath(tree):
+                if section.getparent() is not None:
+                    section.drop_tree()
             
-            # IGNORER les sections avec "catalogue" dans les attributs
-            for catalog_section in soup.find_all(attrs={'class': re.compile(r'catalogue', re.I)}):
-                catalog_section.decompose()
-            for catalog_section in soup.find_all(attrs={'id': re.compile(r'catalogue', re.I)}):
-                catalog_section.decompose()
+            div_contexts = {}
+            banner_flags = {}
             
-            # Rechercher spécifiquement dans toutes les divs restantes
-            divs = soup.find_all('div')
-            logger.info(f"Analysing {len(divs)} divs sur {page_url} (après filtrage)")
+            def div_context_of(div) -> str:
+                context = div_contexts.get(div)
+                if context is None:
+                    context = ' '.join([div.get('class', ''), div.get('id', ''), div.get('style', '')])
+                    div_contexts[div] = context
+                return context
             
-            for div in divs:
-                # Obtenir le contexte de la div (CORRECTION DU BUG)
-                div_classes = div.get('class', [])
-                if isinstance(div_classes, list):
-                    div_classes = ' '.join(div_classes)
-                else:
-                    div_classes = str(div_classes)
+            # Images en arrière-plan CSS: seules les divs dont le style contient un
+            # background url(...) sont remontées par libxml2 (MAIS PAS les headers/banners)
+            for div in self._background_divs_xpath(tree):
+                div_context = div_context_of(div)
+                if self._div_bg_context_re.search(div_context):
+                    continue
+                # Extraire l'URL depuis background-image: url(...)
+                for match in self._background_url_re.findall(div.get('style', '')):
+                    normalized_url = self.normalize_image_url(match, base)
+                    if normalized_url and not self.should_skip_image(normalized_url, div_context):
+                        image_urls.add(normalized_url)
+                        logger.debug(f"Image CSS trouvée dans div: {normalized_url}")
+            
+            # Un seul parcours des images; le contexte d'une div n'est calculé que si elle contient une image
+            for img in tree.iter('img'):
+                img_prefix = ' '.join([img.get('class', ''), img.get('alt', ''), img.get('title', '')])
                 
-                div_context = ' '.join([
-                    div_classes,
-                    str(div.get('id', '')),
-                    str(div.get('style', ''))
-                ])
+                # Essayer différents attributs d'image (normalisés une seule fois par image)
+                candidates = []
+                for attr in ['src', 'data-src', 'data-lazy-src', 'data-original', 'srcset']:
+                    src = img.get(attr)
+                    if src:
+                        # Pour srcset, prendre la variante de plus haute résolution
+                        if attr == 'srcset':
+                            src = self.best_srcset_url(src)
+                            if not src:
+                                continue
+                        candidates.append((attr, self.normalize_image_url(src, base)))
                 
-                # Images dans les balises img à l'intérieur des divs
-                for img in div.find_all('img'):
-                    # Obtenir le contexte de l'image (CORRECTION DU BUG)
-                    img_classes = img.get('class', [])
-                    if isinstance(img_classes, list):
-                        img_classes = ' '.join(img_classes)
-                    else:
-                        img_classes = str(img_classes)
-                    
-                    img_context = ' '.join([
-                        img_classes,
-                        str(img.get('alt', '')),
-                        str(img.get('title', '')),
-                        div_context
-                    ])
-                    
-                    # Essayer différents attributs d'image
-                    for attr in ['src', 'data-src', 'data-lazy-src', 'data-original', 'srcset']:
-                        src = img.get(attr)
-                        if src:
-                            # Pour srcset, prendre la première URL
-                            if attr == 'srcset':
-                                src = src.split(',')[0].split(' ')[0]
-                            
-                            normalized_url = self.normalize_image_url(src, page_url)
-                            if normalized_url and not self.should_skip_image(normalized_url, img_context):
-                                image_urls.add(normalized_url)
-                                logger.debug(f"Image trouvée dans div: {normalized_url}")
+                # Images dans les balises img à l'intérieur des divs (contexte de chaque div ancêtre)
+                for div in img.iterancestors('div'):
+                    img_context = f"{img_prefix} {div_context_of(div)}"
+                    for _, normalized_url in candidates:
+                        if normalized_url and not self.should_skip_image(normalized_url, img_context):
+                            image_urls.add(normalized_url)
+                            logger.debug(f"Image trouvée dans div: {normalized_url}")
                 
-                # Images en arrière-plan CSS dans les divs (MAIS PAS les headers/banners)
-                if not re.search(r'header|banner|hero|cover|background.*large|bg.*main', div_context, re.I):
-                    style = div.get('style', '')
-                    if 'background-image' in style or 'background' in style:
-                        # Extraire l'URL depuis background-image: url(...)
-                        matches = re.findall(r'background(?:-image)?:\s*url\(["\']?(.*?)["\']?\)', style)
-                        for match in matches:
-                            normalized_url = self.normalize_image_url(match, page_url)
-                            if normalized_url and not self.should_skip_image(normalized_url, div_context):
-                                image_urls.add(normalized_url)
-                                logger.debug(f"Image CSS trouvée dans div: {normalized_url}")
+                # Images hors des divs, sauf sous un header/banner (drapeau hérité des ancêtres).
+                # Hors de ces sections, seul le filtre sur l'URL peut encore s'appliquer
+                if not self._under_banner(img.getparent(), banner_flags):
+                    for attr, normalized_url in candidates:
+                        if attr != 'srcset' and normalized_url and not self.should_skip_image(normalized_url):
+                            image_urls.add(normalized_url)
             
-            # Aussi chercher dans tous les éléments pouvant contenir des images (mais pas les headers)
-            for img in soup.find_all('img'):
-                # Vérifier que l'image n'est pas dans un header
-                parent_context = ""
-                parent = img.parent
-                while parent and parent.name:
-                    parent_classes = parent.get('class', [])
-                    if isinstance(parent_classes, list):
-                        parent_classes = ' '.join(parent_classes)
-                    else:
-                        parent_classes = str(parent_classes)
-                    
-                    parent_context += f" {parent.name} {parent_classes} {parent.get('id', '')}"
-                    parent = parent.parent
-                
-                if not re.search(r'header|banner|hero|cover|catalogue', parent_context, re.I):
-                    for attr in ['src', 'data-src', 'data-lazy-src', 'data-original']:
-                        src = img.get(attr)
-                        if src:
-                            normalized_url = self.normalize_image_url(src, page_url)
-                            if normalized_url and not self.should_skip_image(normalized_url, parent_context):
-                                image_urls.add(normalized_url)
+            # Compte issu du parcours déjà effectué (pas de second passage sur l'arbre)
+            logger.info(f"{len(image_urls)} images retenues sur {page_url} (après filtrage)")
                             
         except Exception as e:
             logger.error(f"Erreur lors de l'extraction d'images depuis {page_url}: {e}")
         
         return image_urls
 
-    def normalize_image_url(self, url: str, base_url: str) -> Optional[str]:
-        """Normalise une URL d'image"""
+    def best_srcset_url(self, srcset: str) -> Optional[str]:
+        """Retourne l'URL de plus haute résolution d'un attribut srcset (None si vide)"""
+        best_url, best_size = None, -1.0
+        for url, descriptor in self._srcset_re.findall(srcset):
+            size = float(descriptor) if descriptor else 1.0
+            if size > best_size:
+                best_url, best_size = url, size
+        return best_url
+
+    def normalize_image_url(self, url: str, base_url: Union[str, URL]) -> Optional[str]:
+        """Normalise une URL d'image (base_url peut être une URL yarl déjà analysée)"""
         try:
-            # Joindre l'URL relative à l'URL de base
-            full_url = urljoin(base_url, url)
+            base = base_url if isinstance(base_url, URL) else URL(base_url)
             
-            # Décoder l'URL
-            full_url = unquote(full_url)
+            # Joindre l'URL relative à l'URL de base puis décoder l'URL
+            full_url = base.join(URL(url)).human_repr()
             
             # Vérifier que c'est bien une image
-            if re.search(r'\.(jpg|jpeg|png|gif|bmp|webp|svg)(\?|$)', full_url.lower()):
+            if self._classify_url(full_url) == "image":
                 return full_url
             
             # Accepter aussi les URLs Google qui peuvent contenir des images
@@ -359,59 +470,208 @@ class FlashBackScraper:
         except Exception:
             return None
 
-    async def fetch_page(self, url: str) -> Optional[Tuple[str, str]]:
-        """Récupère le contenu d'une page web"""
-        async with self.semaphore:
+    async def apply_robots_crawl_delay(self, url: str):
+        """Lit robots.txt une fois par hôte et applique son Crawl-delay au limiteur"""
+        parsed_url = urlparse(url)
+        host = parsed_url.netloc
+        
+        async with self._robots_lock:
+            if host in self._robots_checked:
+                return
+            self._robots_checked.add(host)
+            
             try:
-                await asyncio.sleep(self.delay_between_requests)
+                robots_url = f"{parsed_url.scheme}://{host}/robots.txt"
+                headers = self.next_headers()
+                async with self.session.get(robots_url, headers=headers,
+                                            timeout=self.page_timeout) as response:
+                    if response.status != 200:
+                        return
+                    robots_txt = await response.text()
                 
-                logger.info(f"Fetching: {url}")
-                async with self.session.get(url) as response:
-                    if response.status == 200:
-                        content_type = response.headers.get('content-type', '').lower()
-                        if 'text/html' in content_type:
-                            content = await response.text()
-                            logger.info(f"✓ Page récupérée: {url} ({len(content)} chars)")
-                            return url, content
-                    else:
-                        logger.warning(f"Status {response.status} pour {url}")
-                        
-            except asyncio.TimeoutError:
-                logger.error(f"Timeout pour {url}")
+                parser = RobotFileParser()
+                parser.parse(robots_txt.splitlines())
+                crawl_delay = parser.crawl_delay(headers['User-Agent'])
+                if crawl_delay:
+                    self.rate_limiter.set_crawl_delay(host, float(crawl_delay))
+                    logger.info(f"Crawl-delay de {crawl_delay}s appliqué pour {host}")
             except Exception as e:
-                logger.error(f"Erreur lors du fetch de {url}: {e}")
+                logger.debug(f"robots.txt indisponible pour {host}: {e}")
+
+    def get_host_semaphore(self, host: str) -> asyncio.Semaphore:
+        """Retourne le semaphore limitant la concurrence vers un hôte"""
+        semaphore = self.host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.config.max_concurrent_per_host)
+            self.host_semaphores[host] = semaphore
+        return semaphore
+
+    async def hedged(self, primary, hedge):
+        """
+        Exécute une requête avec hedging: si la requête principale n'a pas abouti
+        après hedge_after_ms, une requête de secours est lancée et la première
+        réponse non vide l'emporte (les autres sont annulées)
+        
+        Args:
+            primary: Coroutine de la requête principale
+            hedge: Fabrique de coroutines pour les requêtes de secours
+        
+        Returns:
+            Premier résultat différent de None, None si toutes les requêtes ont échoué
+        """
+        hedge_after_ms = self.config.hedge_after_ms
+        hedge_cap = self.config.hedge_cap
+        if not hedge_after_ms or hedge_cap < 2:
+            return await primary
+        
+        tasks = {asyncio.ensure_future(primary)}
+        pending = set(tasks)
+        try:
+            while pending:
+                timeout = hedge_after_ms / 1000 if len(tasks) < hedge_cap else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                # Un échec rapide (None) ne l'emporte pas: on attend les requêtes encore en vol
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        return result
+                
+                if not done:
+                    logger.debug("Requête lente, envoi d'une requête de secours")
+                    hedge_task = asyncio.ensure_future(hedge())
+                    tasks.add(hedge_task)
+                    pending.add(hedge_task)
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def get_page(self, url: str, outcome: Dict[str, float]) -> Optional[Tuple[str, str]]:
+        """
+        Effectue une requête GET de page
+        
+        Args:
+            url: URL de la page
+            outcome: Résultat partagé par les requêtes d'un même fetch ('ttfb' si succès,
+                'failed' si 429/5xx/timeout), transmis une seule fois au limiteur par fetch_page
+        """
+        try:
+            logger.info(f"Fetching: {url}")
+            start = time.monotonic()
+            async with self.session.get(url, headers=self.next_headers(),
+                                        timeout=self.page_timeout) as response:
+                if response.status == 200:
+                    outcome.setdefault('ttfb', time.monotonic() - start)
+                    content_type = response.headers.get('content-type', '').lower()
+                    if 'text/html' in content_type:
+                        content = await response.text()
+                        logger.info(f"✓ Page récupérée: {url} ({len(content)} chars)")
+                        return url, content
+                else:
+                    if response.status == 429 or response.status >= 500:
+                        outcome['failed'] = True
+                    logger.warning(f"Status {response.status} pour {url}")
+                    
+        except asyncio.TimeoutError:
+            outcome['failed'] = True
+            logger.error(f"Timeout pour {url}")
+        except Exception as e:
+            outcome['failed'] = True
+            logger.error(f"Erreur lors du fetch de {url}: {e}")
         
         return None
 
+    async def fetch_page(self, url: str) -> Optional[Tuple[str, str]]:
+        """Récupère le contenu d'une page web"""
+        host = urlparse(url).netloc
+        host_semaphore = self.get_host_semaphore(host)
+        outcome: Dict[str, float] = {}
+        
+        if self.config.crawl_delay_respect_robots:
+            await self.apply_robots_crawl_delay(url)
+        
+        async def hedge_request():
+            # Une requête de secours occupe son propre créneau de l'hôte: pas de secours si aucun n'est libre
+            if host_semaphore.locked():
+                return None
+            async with host_semaphore:
+                # Elle consomme aussi un jeton du limiteur
+                if not await self.rate_limiter.acquire(host):
+                    return None
+                return await self.get_page(url, outcome)
+        
+        async with self.semaphore, host_semaphore:
+            if not await self.rate_limiter.acquire(host):
+                logger.warning(f"Hôte abandonné après trop d'échecs: {host}")
+                return None
+            
+            try:
+                return await self.hedged(self.get_page(url, outcome), hedge_request)
+            finally:
+                # Un seul résultat par fetch logique, quel que soit le nombre de requêtes envoyées
+                if 'ttfb' in outcome:
+                    self.rate_limiter.record_success(host, outcome['ttfb'])
+                elif outcome.get('failed'):
+                    self.rate_limiter.record_failure(host)
+
     async def download_image(self, image_url: str, session: aiohttp.ClientSession) -> bool:
         """Télécharge une image avec validation de taille et détection de doublons"""
+        host = urlparse(image_url).netloc
         try:
             # Vérifier encore une fois si l'image doit être ignorée
             if self.should_skip_image(image_url):
                 logger.debug(f"Image ignorée lors du téléchargement: {image_url}")
                 return False
             
-            async with session.get(image_url) as response:
+            start = time.monotonic()
+            async with session.get(image_url, headers=self.next_headers(),
+                                   timeout=self.download_timeout) as response:
                 if response.status == 200:
-                    content = await response.read()
+                    self.rate_limiter.record_success(host, time.monotonic() - start)
+                    max_image_bytes = self.config.max_image_bytes
+                    
+                    # Taille annoncée trop grande: ne pas transférer le corps du tout
+                    content_length = response.content_length
+                    if content_length and content_length > max_image_bytes:
+                        logger.debug(f"Image trop lourde ignorée (Content-Length {content_length} bytes): {image_url}")
+                        self.stats['size_filtered'] += 1
+                        return False
+                    
+                    if self.config.stream_downloads:
+                        # Lecture par morceaux: hachage au fil de l'eau et abandon dès que la limite est dépassée
+                        buffer = bytearray()
+                        hasher = new_content_hasher()
+                        async for chunk in response.content.iter_chunked(self.config.chunk_size):
+                            buffer += chunk
+                            hasher.update(chunk)
+                            if len(buffer) > max_image_bytes:
+                                logger.debug(f"Image trop lourde ignorée (> {max_image_bytes} bytes): {image_url}")
+                                return False
+                        content = bytes(buffer)
+                        content_hash = hasher_digest(hasher)
+                    else:
+                        content = await response.read()
+                        content_hash = hash_content(content)
                     
                     # Vérifier la taille du fichier (ignorer les très gros fichiers)
-                    if len(content) > 15 * 1024 * 1024:  # Plus de 15MB
+                    if len(content) > max_image_bytes:
                         logger.debug(f"Image trop lourde ignorée ({len(content)} bytes): {image_url}")
                         return False
                     
-                    # Calculer le hash du contenu pour détecter les doublons
-                    content_hash = hashlib.md5(content).hexdigest()
+                    # Détecter les doublons par empreinte du contenu
                     if content_hash in self.image_hashes:
-                        logger.debug(f"Image dupliquée ignorée (hash: {content_hash[:8]}...): {image_url}")
+                        logger.debug(f"Image dupliquée ignorée (hash: {hash_suffix(content_hash)}): {image_url}")
                         self.stats['duplicates_removed'] += 1
                         return False
                     
                     # Vérifier que c'est bien une image valide et de taille suffisante
-                    if HAS_PILLOW:
+                    if HAS_IMAGESIZE or HAS_PILLOW:
                         try:
-                            img = Image.open(io.BytesIO(content))
-                            width, height = img.size
+                            width, height = await asyncio.get_running_loop().run_in_executor(
+                                self._exec, _probe_dims, content
+                            )
                             
                             # Filtrer les images trop petites (< 100x100px)
                             if width < 100 or height < 100:
@@ -431,7 +691,7 @@ class FlashBackScraper:
                             logger.warning(f"Fichier non valide ignoré: {image_url}")
                             return False
                     else:
-                        # Sans Pillow, on se contente de vérifier la taille du fichier
+                        # Sans imagesize ni Pillow, on se contente de vérifier la taille du fichier
                         if len(content) < 1000:  # Moins de 1KB, probablement pas une vraie image
                             logger.debug(f"Fichier trop petit ignoré: {image_url}")
                             self.stats['size_filtered'] += 1
@@ -449,8 +709,8 @@ class FlashBackScraper:
                         filename = f"flashback_image_{abs(hash(image_url))}.jpg"
                     
                     # Nettoyer le nom de fichier
-                    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-                    if not re.search(r'\.(jpg|jpeg|png|gif|bmp|webp|svg)$', filename.lower()):
+                    filename = self._unsafe_filename_re.sub('_', filename)
+                    if self._classify_url(filename) != "image":
                         filename += '.jpg'
                     
                     # Préfixer avec flashback pour l'organisation
@@ -458,46 +718,72 @@ class FlashBackScraper:
                     
                     # Ajouter le hash pour éviter les collisions de noms
                     name_part, ext_part = os.path.splitext(filename)
-                    filename = f"{name_part}_{content_hash[:8]}{ext_part}"
+                    filename = f"{name_part}_{hash_suffix(content_hash)}{ext_part}"
                     
                     filepath = self.output_dir / filename
                     
-                    # Ajouter le hash à notre set de tracking
+                    # Ajouter l'empreinte à notre set de tracking
                     self.image_hashes.add(content_hash)
                     
                     # Sauvegarder l'image
-                    async with aiofiles.open(filepath, 'wb') as f:
-                        await f.write(content)
+                    # (un seul aller-retour dans le pool de threads pour open + write + close)
+                    await asyncio.to_thread(_sync_write, filepath, content)
                     
                     logger.info(f"✓ Image sauvegardée: {filename}")
                     self.stats['images_downloaded'] += 1
+                    if self.image_queue is not None:
+                        await self.image_queue.put(filepath)
                     return True
                 else:
+                    if response.status == 429 or response.status >= 500:
+                        self.rate_limiter.record_failure(host)
                     logger.warning(f"Échec téléchargement {image_url}: status {response.status}")
                     
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self.rate_limiter.record_failure(host)
+            logger.error(f"Erreur téléchargement {image_url}: {e}")
         except Exception as e:
             logger.error(f"Erreur téléchargement {image_url}: {e}")
         
         self.stats['images_skipped'] += 1
         return False
 
+    async def download_with_limits(self, image_url: str) -> bool:
+        """Télécharge une image en respectant les semaphores et le limiteur de débit de son hôte"""
+        host = urlparse(image_url).netloc
+        # Pas de délai fixe: la concurrence est bornée par les semaphores et le
+        # limiteur ne ralentit un hôte qu'après un 429/5xx/timeout
+        async with self.semaphore, self.get_host_semaphore(host):
+            if not await self.rate_limiter.acquire(host):
+                self.stats['images_skipped'] += 1
+                return False
+            # Réutiliser la session des phases 1-2: les connexions (TCP+TLS) vers Google restent chaudes
+            return await self.download_image(image_url, self.session)
+
+    async def _download_worker(self, queue: asyncio.Queue, stats: Dict[str, int], pbar):
+        """
+        Consomme les URLs d'images de la file jusqu'à recevoir la sentinelle None
+        
+        Args:
+            queue: File des URLs d'images à télécharger
+            stats: Statistiques du crawl (images_downloaded est incrémenté)
+            pbar: Barre de progression des téléchargements
+        """
+        while True:
+            image_url = await queue.get()
+            if image_url is None:
+                return
+            if await self.download_with_limits(image_url):
+                stats['images_downloaded'] += 1
+            pbar.update(1)
+
     async def cleanup_output_directory(self):
         """Nettoie le répertoire de sortie pour commencer un nouveau scraping."""
         if self.output_dir.exists():
             logger.info(f"Nettoyage du répertoire de sortie: {self.output_dir}")
-            for item in self.output_dir.iterdir():
-                if item.is_file():
-                    try:
-                        item.unlink()
-                        logger.debug(f"Fichier supprimé: {item}")
-                    except Exception as e:
-                        logger.error(f"Erreur lors de la suppression du fichier {item}: {e}")
-                elif item.is_dir():
-                    try:
-                        item.rmdir()
-                        logger.debug(f"Dossier supprimé: {item}")
-                    except Exception as e:
-                        logger.error(f"Erreur lors de la suppression du dossier {item}: {e}")
+            # Une seule traversée (rmtree) hors de la boucle d'événements, puis recréation du dossier
+            await asyncio.to_thread(shutil.rmtree, self.output_dir, ignore_errors=True)
+            self.output_dir.mkdir(parents=True, exist_ok=True)
             logger.info(f"Répertoire de sortie nettoyé: {self.output_dir}")
         else:
             logger.info(f"Répertoire de sortie déjà vide: {self.output_dir}")
@@ -533,6 +819,14 @@ class FlashBackScraper:
         
         logger.info(f"📄 {len(self.navbar_pages)} pages de navigation découvertes")
         
+        # Phase 3 (en parallèle de la phase 2): les workers téléchargent les images dès leur découverte
+        download_queue: asyncio.Queue = asyncio.Queue()
+        images_pbar = tqdm(desc="Images FlashBack", unit="img", position=1)
+        workers = [
+            asyncio.create_task(self._download_worker(download_queue, stats, images_pbar))
+            for _ in range(self.max_concurrent)
+        ]
+        
         # Phase 2: Crawler toutes les pages découvertes (SANS la page d'accueil)
         logger.info("Phase 2: Crawling des pages de navigation (hors accueil)...")
         
@@ -563,40 +857,26 @@ class FlashBackScraper:
                         
                         # Extraire les images de cette page (toutes SAUF l'accueil)
                         page_images = self.extract_image_urls_from_html(content, url)
-                        self.found_images.update(page_images)
                         logger.info(f"📄 Page {url}: {len(page_images)} images trouvées")
                         
+                        # Mettre en file uniquement les images pas encore vues
+                        for image_url in page_images - self.found_images:
+                            download_queue.put_nowait(image_url)
+                        self.found_images.update(page_images)
+                        
                         # PLUS de découverte de navbar - on a déjà tout découvert depuis l'accueil
                         # (supprimé pour éviter les logs répétitifs)
         
         stats['images_found'] = len(self.found_images)
         logger.info(f"Phase 2 terminée: {stats['pages_crawled']} pages, {stats['images_found']} images trouvées")
         
-        # Phase 3: Télécharger toutes les images
+        # Phase 3: Terminer les téléchargements en cours
         logger.info("Phase 3: Téléchargement des images FlashBack...")
         
-        if self.found_images:
-            # Session spéciale pour les téléchargements
-            connector = aiohttp.TCPConnector(limit=self.max_concurrent)
-            timeout = aiohttp.ClientTimeout(total=self.timeout * 2)
-            
-            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers) as download_session:
-                semaphore = asyncio.Semaphore(max(1, self.max_concurrent // 2))  # Plus conservateur
-                
-                async def download_with_semaphore(image_url):
-                    async with semaphore:
-                        await asyncio.sleep(0.2)  # Délai entre téléchargements
-                        return await self.download_image(image_url, download_session)
-                
-                # Télécharger toutes les images avec barre de progression
-                tasks = [download_with_semaphore(img_url) for img_url in self.found_images]
-                
-                results = []
-                for task in tqdm.as_completed(tasks, desc="Images FlashBack", unit="img"):
-                    result = await task
-                    results.append(result)
-                    if result:
-                        stats['images_downloaded'] += 1
+        for _ in workers:
+            download_queue.put_nowait(None)
+        await asyncio.gather(*workers)
+        images_pbar.close()
         
         end_time = time.time()
         duration = end_time - start_time
@@ -651,4 +931,6 @@ async def main():
             print(f"   ✅ Taux de réussite: {success_rate:.1f}%")
 
 if __name__ == "__main__":
+    backend = install_event_loop_policy(get_config().io_backend)
+    logger.info(f"Boucle d'événements: {backend}")
     asyncio.run(main()) 
\ No newline at end of file
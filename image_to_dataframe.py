@@ -6,33 +6,191 @@ Analyse directement toutes les images de tableaux et retourne des DataFrames str
 
 import pandas as pd
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
 import base64
 import json
 import os
 import sys
+import time
+import argparse
 from pathlib import Path
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, NamedTuple, Optional, Tuple, Union
 import re
 from PIL import Image
 import io
 import shutil
+import hashlib
+import concurrent.futures
+from itertools import islice, repeat
 
 def load_env_file():
     """Charge le fichier .env s'il existe"""
     env_file = Path('.env')
     if env_file.exists():
         try:
-            with open(env_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        os.environ[key] = value
+            # Lecture en une fois, variables ajoutées en un seul update
+            lines = (line.strip() for line in env_file.read_text(encoding='utf-8', errors='ignore').splitlines())
+            os.environ.update(
+                (key.strip(), value.strip())
+                for line in lines
+                if line and not line.startswith('#') and '=' in line
+                for key, value in [line.split('=', 1)]
+            )
         except Exception as e:
             print(f"⚠️ Erreur lors du chargement du fichier .env: {e}")
 
+# OpenCV (libjpeg-turbo) pour le redimensionnement et l'encodage JPEG, Pillow en repli
+try:
+    import cv2
+    import numpy as np
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+# Client HTTP du SDK OpenAI, réglé explicitement (pool de connexions, HTTP/2 si h2 est installé)
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    import h2  # noqa: F401 - requis par httpx pour HTTP/2
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
+# orjson pour parser les réponses de l'IA et le cache (plus rapide que json), stdlib en repli
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# aiohttp pour appeler directement l'endpoint chat/completions (option direct_http)
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# Codes HTTP relancés avec backoff exponentiel en mode direct_http
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# pybase64 (SIMD) pour l'encodage base64 des images envoyées à l'API, stdlib en repli
+try:
+    import pybase64
+    HAS_PYBASE64 = True
+except ImportError:
+    HAS_PYBASE64 = False
+
+# imagehash pour regrouper les images quasi identiques avant les appels Vision (optionnel)
+try:
+    import imagehash
+    HAS_IMAGEHASH = True
+except ImportError:
+    HAS_IMAGEHASH = False
+
+# Taille du hash perceptuel (16 -> 256 bits): assez fin pour distinguer deux tableaux de même mise en page
+PHASH_SIZE = 16
+
+# Extensions des images analysées
+IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'})
+
+# Formats laissés à Pillow (non ou mal pris en charge par cv2.imdecode)
+PIL_ONLY_EXTENSIONS = {'.gif', '.webp'}
+
+# Modèle Vision et version des prompts d'extraction, repris dans la clé du cache Vision
+# (incrémenter PROMPT_VERSION à chaque modification des prompts pour invalider les réponses en cache)
+VISION_MODEL = "gpt-4o"
+PROMPT_VERSION = 2
+
+# Taille des blocs lus pour calculer l'empreinte d'un fichier image (file_hash)
+HASH_CHUNK_SIZE = 1 << 20
+
+# Côté le plus long envoyé à l'API: suffisant pour lire les cellules de tableaux
+MAX_IMAGE_SIZE = 1024
+
+# Taille maximale d'un JPEG envoyé tel quel (au-delà, le réencodage en qualité 85 est plus léger)
+RAW_JPEG_MAX_BYTES = 4_000_000
+
+# Préfixe des images JPEG transmises en data URL
+JPEG_DATA_URL_PREFIX = "data:image/jpeg;base64,"
+
+# Côté le plus long envoyé en détail "low": l'API ramène de toute façon l'image à 512x512
+LOW_DETAIL_SIZE = 512
+
+# Écart de niveau de gris avec le fond (coin supérieur gauche) au-delà duquel un pixel est du contenu
+CROP_THRESHOLD = 16
+
+# Mots-clés de classement des colonnes et des valeurs (normalize_table_data)
+AUTH_KEYWORDS = ('indépendant', 'pf offi', 'gang', 'orga', 'autorisation')
+PRICE_KEYWORDS = ('prix', 'price', 'coût', 'cost', 'revente')
+QTY_KEYWORDS = ('munitions', 'quantité', 'max', 'stock')
+ALLOWED_SYMBOLS = ('✓', 'oui', 'yes', 'autoris', 'allow', 'permit')
+FORBIDDEN_SYMBOLS = ('✗', '❌', 'non', 'no', 'interdit', 'forbid', 'deny')
+
+# Colonnes de métadonnées ajoutées à chaque ligne, et mots-clés des colonnes affichées en premier
+META_COLUMNS = ('Table_Type', 'Source_Image')
+PRIORITY_COLUMNS = ('ARME', 'NOM', 'OBJET', 'VEHICULE')
+
+def _alternation(words: Tuple[str, ...]) -> re.Pattern:
+    return re.compile('|'.join(re.escape(word) for word in words))
+
+# Regex compilées une seule fois au chargement du module
+_AUTH_COLUMN_RE = _alternation(AUTH_KEYWORDS)
+_PRICE_COLUMN_RE = _alternation(PRICE_KEYWORDS)
+_QTY_COLUMN_RE = _alternation(QTY_KEYWORDS)
+_ALLOWED_RE = _alternation(ALLOWED_SYMBOLS)
+_FORBIDDEN_RE = _alternation(FORBIDDEN_SYMBOLS)
+_DIGITS_RE = re.compile(r'(\d+)')
+
+def json_loads(data: Union[str, bytes]):
+    """Parse un document JSON (str ou bytes); lève json.JSONDecodeError si invalide"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj) -> bytes:
+    """Sérialise en JSON UTF-8 (bytes)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def b64encode_str(data) -> str:
+    """Encode un buffer d'octets (bytes, memoryview) en base64 ASCII pour les data URLs de l'API OpenAI"""
+    if HAS_PYBASE64:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('ascii')
+
+def list_image_files(images_dir: Union[str, Path]) -> List[Path]:
+    """Liste les images d'un répertoire en un seul parcours (os.scandir), triées par nom pour un ordre cohérent"""
+    images_dir = Path(images_dir)
+    if not images_dir.is_dir():
+        return []
+    
+    with os.scandir(images_dir) as entries:
+        return sorted(
+            (Path(entry.path) for entry in entries
+             if entry.name.rpartition('.')[2].lower() in IMAGE_EXTENSIONS and entry.is_file()),
+            key=lambda path: path.name
+        )
+
+class PreparedImage(NamedTuple):
+    """Image prête pour l'API OpenAI (types simples, transmissible entre processus)"""
+    image_url: str      # Data URL JPEG pour le détail "high" (MAX_IMAGE_SIZE)
+    image_url_low: str  # Data URL JPEG pour le détail "low" (LOW_DETAIL_SIZE)
+    width: int
+    height: int
+
+def image_dimensions(img) -> Tuple[int, int]:
+    """Retourne (largeur, hauteur) d'une image Pillow ou d'un tableau OpenCV"""
+    if HAS_CV2 and isinstance(img, np.ndarray):
+        return img.shape[1], img.shape[0]
+    return img.size
+
 # Charger les variables d'environnement depuis .env
 load_env_file()
 
@@ -40,14 +198,289 @@ load_env_file()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def resize_to_fit(img: Union[Image.Image, 'np.ndarray'], max_size: int,
+                  fast: bool = False) -> Union[Image.Image, 'np.ndarray']:
+    """
+    Réduit une image (OpenCV ou Pillow) pour que son plus grand côté tienne dans max_size
+    
+    Args:
+        img: Image OpenCV (BGR) ou Pillow
+        max_size: Taille maximale du plus grand côté
+        fast: Filtre BILINEAR côté Pillow (détail "low") au lieu de LANCZOS
+    """
+    width, height = image_dimensions(img)
+    if max(width, height) <= max_size:
+        return img
+    
+    ratio = max_size / max(width, height)
+    new_size = (int(width * ratio), int(height * ratio))
+    if HAS_CV2 and isinstance(img, np.ndarray):
+        return cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+    resample = Image.Resampling.BILINEAR if fast else Image.Resampling.LANCZOS
+    return img.resize(new_size, resample)
+
+def load_image(image_path: Path) -> Optional[Union[Image.Image, 'np.ndarray']]:
+    """
+    Ouvre une image, rognée sur son contenu (marges unies retirées) et redimensionnée pour l'API OpenAI
+    
+    Returns:
+        Tableau BGR OpenCV si cv2 est disponible (Pillow RGB pour GIF/WebP ou sans cv2), None en cas d'erreur
+    """
+    # Redimensionner si trop grande: au-delà, les pixels coûtent des tokens sans aider la lecture
+    max_size = MAX_IMAGE_SIZE
+    
+    if HAS_CV2 and image_path.suffix.lower() not in PIL_ONLY_EXTENSIONS:
+        try:
+            # np.fromfile + imdecode: fonctionne aussi avec les chemins non ASCII
+            arr = cv2.imdecode(np.fromfile(str(image_path), dtype=np.uint8), cv2.IMREAD_COLOR)
+            if arr is not None:
+                # Rogner les marges de la couleur du fond
+                gray = cv2.cvtColor(arr, cv2.COLOR_BGR2GRAY)
+                mask = cv2.absdiff(gray, np.full_like(gray, gray[0, 0])) > CROP_THRESHOLD
+                points = cv2.findNonZero(mask.astype(np.uint8))
+                if points is not None:
+                    x, y, w, h = cv2.boundingRect(points)
+                    arr = arr[y:y + h, x:x + w]
+                
+                return resize_to_fit(arr, max_size)
+        except Exception as e:
+            logger.debug(f"OpenCV n'a pas pu lire {image_path}, repli sur Pillow: {e}")
+    
+    try:
+        # Ouvrir et redimensionner l'image si nécessaire
+        with Image.open(image_path) as img:
+            # Convertir en RGB (copie détachée du fichier)
+            img = img.convert('RGB')
+            
+            # Rogner les marges de la couleur du fond
+            gray = img.convert('L')
+            background = gray.getpixel((0, 0))
+            bbox = gray.point(lambda p: 255 if abs(p - background) > CROP_THRESHOLD else 0).getbbox()
+            if bbox:
+                img = img.crop(bbox)
+            
+            return resize_to_fit(img, max_size)
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de l'ouverture de {image_path}: {e}")
+        return None
+
+def file_hash(image_path: Union[str, Path]) -> str:
+    """
+    Empreinte BLAKE2b (128 bits) des octets du fichier: clé du cache Vision, stable aux renommages
+    
+    Lecture par blocs de HASH_CHUNK_SIZE dans un tampon réutilisé: mémoire bornée quelle que soit la taille de l'image
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(image_path, 'rb', buffering=0) as f:
+        while size := f.readinto(buffer):
+            hasher.update(view[:size])
+    return hasher.hexdigest()
+
+def encode_to_base64(img: Union[Image.Image, 'np.ndarray']) -> str:
+    """Encode une image déjà chargée en JPEG base64 pour l'API OpenAI"""
+    if HAS_CV2 and isinstance(img, np.ndarray):
+        ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if not ok:
+            raise ValueError("échec de cv2.imencode")
+        return b64encode_str(encoded.data)
+    
+    # Encodeur en une passe: ni optimisation Huffman ni JPEG progressif, chroma 4:2:0
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=85, subsampling=2, optimize=False, progressive=False)
+    return b64encode_str(buffer.getbuffer())
+
+def read_jpeg_as_is(image_path: str) -> Optional[PreparedImage]:
+    """
+    Lit un JPEG qui tient déjà dans MAX_IMAGE_SIZE sans le décoder
+    
+    Seul l'en-tête est lu par Pillow pour connaître les dimensions; les marges
+    ne sont pas rognées et le même JPEG sert aux deux niveaux de détail.
+    
+    Returns:
+        PreparedImage, None si l'image doit être retraitée
+    """
+    if Path(image_path).suffix.lower() not in ('.jpg', '.jpeg'):
+        return None
+    try:
+        # Fichier anormalement lourd pour sa taille (qualité maximale, métadonnées): réencoder
+        if os.stat(image_path).st_size >= RAW_JPEG_MAX_BYTES:
+            return None
+        with Image.open(image_path) as img:
+            # CMYK/YCCK et autres modes exotiques: rendu incertain côté API, passer par la conversion RGB
+            if img.format != 'JPEG' or img.mode not in ('RGB', 'L') or max(img.size) > MAX_IMAGE_SIZE:
+                return None
+            width, height = img.size
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except Exception as e:
+        logger.debug(f"Lecture directe impossible pour {image_path}: {e}")
+        return None
+    image_url = JPEG_DATA_URL_PREFIX + b64encode_str(data)
+    return PreparedImage(image_url, image_url, width, height)
+
+def preprocess_image(image_path: str) -> Optional[PreparedImage]:
+    """
+    Prépare une image pour l'API OpenAI (exécuté dans le pool de prétraitement)
+    
+    Fonction de module (sérialisable par pickle, utilisable avec un pool de processus):
+    seuls des types simples sont retournés, jamais les pixels décodés.
+    
+    Returns:
+        PreparedImage, None en cas d'erreur
+    """
+    # JPEG déjà à la bonne taille: octets du fichier envoyés tels quels (ni décodage ni réencodage)
+    raw = read_jpeg_as_is(image_path)
+    if raw is not None:
+        return raw
+    
+    img = load_image(Path(image_path))
+    if img is None:
+        return None
+    try:
+        width, height = image_dimensions(img)
+        # Data URLs construites ici, dans le pool de prétraitement, et non à chaque requête
+        image_url = JPEG_DATA_URL_PREFIX + encode_to_base64(img)
+        if max(width, height) > LOW_DETAIL_SIZE:
+            image_url_low = JPEG_DATA_URL_PREFIX + encode_to_base64(resize_to_fit(img, LOW_DETAIL_SIZE, fast=True))
+        else:
+            image_url_low = image_url
+        return PreparedImage(image_url, image_url_low, width, height)
+    except Exception as e:
+        logger.error(f"Erreur lors de l'encodage de {image_path}: {e}")
+        return None
+
+def perceptual_hash(image_path: str) -> Optional[str]:
+    """Hash perceptuel (pHash) d'une image en hexadécimal, None en cas d'erreur"""
+    try:
+        with Image.open(image_path) as img:
+            return str(imagehash.phash(img, hash_size=PHASH_SIZE))
+    except Exception as e:
+        logger.debug(f"pHash impossible pour {image_path}: {e}")
+        return None
+
+class VisionCache:
+    """
+    Cache disque des réponses GPT-4 Vision, indexé par (modèle, version des prompts, empreinte
+    du contenu du fichier image): un renommage ou un nouveau téléchargement identique reste
+    un succès de cache, un changement de modèle ou de prompt n'en est jamais un
+    
+    Une entrée = un fichier {empreinte}.{modèle}-v{version}.json contenant
+    {"model", "prompt_version", "created", "tables"}. Les entrées les moins récemment
+    utilisées (dont celles des anciennes versions, jamais relues) sont supprimées au-delà de max_bytes.
+    """
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 512 * 1024 * 1024,
+                 model: str = VISION_MODEL, prompt_version: int = PROMPT_VERSION):
+        # Répertoire partageable entre projets/machines via FLASHBACK_CACHE_DIR
+        self.cache_dir = Path(cache_dir or os.getenv('FLASHBACK_CACHE_DIR', '.vision_cache'))
+        self.max_bytes = max_bytes
+        self.model = model
+        self.prompt_version = prompt_version
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Taille totale du cache tenue à jour à chaque écriture: le dossier n'est parcouru
+        # qu'ici et lors d'une éviction, pas à chaque put
+        self.total_bytes = sum(size for _, size, _ in self.scan_entries())
+    
+    def entry_path(self, key: str) -> Path:
+        """Chemin de l'entrée d'une empreinte pour le modèle et la version de prompts courants"""
+        return self.cache_dir / f"{key}.{self.model}-v{self.prompt_version}.json"
+    
+    def get(self, key: str) -> Optional[List]:
+        """Retourne les tableaux en cache pour cette empreinte (None si absents ou invalides)"""
+        path = self.entry_path(key)
+        try:
+            data = path.read_bytes()
+            entry = json_loads(data)
+            if (not isinstance(entry, dict) or entry.get('model') != self.model
+                    or entry.get('prompt_version') != self.prompt_version
+                    or not isinstance(entry.get('tables'), list)):
+                # Entrée corrompue ou d'un autre format: supprimée, l'image repart à l'API
+                path.unlink()
+                self.total_bytes -= len(data)
+                return None
+            os.utime(path)  # Marquer l'entrée comme récemment utilisée (LRU)
+            return entry['tables']
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def put(self, key: str, tables: List):
+        """Enregistre les tableaux d'une empreinte (écriture atomique)"""
+        path = self.entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        entry = {
+            'model': self.model,
+            'prompt_version': self.prompt_version,
+            'created': time.time(),
+            'tables': tables
+        }
+        data = json_dumps(entry)
+        try:
+            previous_size = path.stat().st_size
+        except OSError:
+            previous_size = 0
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible d'écrire dans le cache Vision: {e}")
+            return
+        
+        self.total_bytes += len(data) - previous_size
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+    
+    def scan_entries(self) -> List[Tuple[float, int, Path]]:
+        """Parcourt le dossier du cache: (mtime, taille, chemin) de chaque entrée"""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def evict(self):
+        """
+        Supprime les entrées les moins récemment utilisées au-delà de max_bytes
+        
+        Le cache est ramené à 90% de max_bytes: les écritures suivantes ne relancent pas
+        aussitôt un parcours du dossier.
+        """
+        entries = self.scan_entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
+
 class UniversalTableExtractorAI:
-    def __init__(self, images_dir: str = "flashback_images", api_key: Optional[str] = None):
+    def __init__(self, images_dir: str = "flashback_images", api_key: Optional[str] = None,
+                 max_concurrent_requests: int = 8, max_retries: int = 5,
+                 dedup_max_distance: int = 0, images_per_request: int = 1,
+                 preprocess_in_processes: bool = False, direct_http: bool = False):
         """
         Extracteur universel de tableaux FlashBack FA utilisant GPT-4 Vision
         
         Args:
             images_dir: Répertoire contenant les images à analyser
             api_key: Clé API OpenAI (optionnel, peut être définie via variable d'environnement)
+            max_concurrent_requests: Nombre d'appels GPT-4 Vision simultanés
+            max_retries: Nombre de nouvelles tentatives (backoff exponentiel) sur 429/5xx/timeout
+            dedup_max_distance: Distance de Hamming maximale entre pHash de deux images doublons
+            images_per_request: Nombre d'images envoyées dans un même appel en détail "low" (1 = un appel par image)
+            preprocess_in_processes: Prétraiter les images dans un pool de processus plutôt que de threads
+            direct_http: Appeler /chat/completions directement avec aiohttp plutôt que via le SDK OpenAI
         """
         self.images_dir = Path(images_dir)
         
@@ -59,50 +492,311 @@ class UniversalTableExtractorAI:
             logger.info("💡 Ou passez-la en paramètre: UniversalTableExtractorAI(api_key='your_key')")
             sys.exit(1)
         
-        self.client = OpenAI(api_key=self.api_key)
+        # Client asynchrone unique: un seul pool de connexions HTTP pour tous les appels,
+        # les erreurs transitoires sont relancées par le SDK avec backoff exponentiel.
+        # En HTTP/2, les appels concurrents sont multiplexés sur une même connexion TLS.
+        http_client = None
+        if HAS_HTTPX:
+            http_client = httpx.AsyncClient(
+                http2=HAS_H2,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                timeout=httpx.Timeout(120, connect=10)
+            )
+        self.client = AsyncOpenAI(api_key=self.api_key, max_retries=max_retries, http_client=http_client)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_retries = max_retries
+        
+        # Appels Vision en ligne via une session aiohttp partagée (créée au premier appel);
+        # le SDK reste utilisé pour l'API Batch et sert de repli si aiohttp est absent
+        self.direct_http = direct_http and HAS_AIOHTTP
+        if direct_http and not HAS_AIOHTTP:
+            logger.warning("⚠️ aiohttp non installé, appels Vision via le SDK OpenAI")
+        self.base_url = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+        self._http_session = None
+        
+        self.images_per_request = max(1, images_per_request)
+        
+        # Cache des réponses IA: une image inchangée n'est jamais renvoyée à l'API
+        self.vision_cache = VisionCache()
+        
+        # Appels en détail "low" et escalades en détail "high"
+        self.vision_stats = {'low': 0, 'escalated': 0}
+        
+        # Distance de Hamming maximale entre pHash pour considérer deux images comme doublons
+        # (0 = pHash identiques; au-delà, deux tableaux ne différant que par quelques chiffres
+        # risquent d'être confondus)
+        self.dedup_max_distance = dedup_max_distance
+        
+        # Pool de prétraitement des images (créé par aprocess_all_images)
+        self.preprocess_in_processes = preprocess_in_processes
+        self._pool = None
         
         # Stockage des DataFrames par type
         self.dataframes = {}
 
     def encode_image_to_base64(self, image_path: Path) -> str:
         """Encode une image en base64 pour l'API OpenAI"""
-        try:
-            # Ouvrir et redimensionner l'image si nécessaire
-            with Image.open(image_path) as img:
-                # Convertir en RGB si nécessaire
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Redimensionner si trop grande (limite OpenAI: 20MB, recommandé: 2048x2048)
-                max_size = 2048
-                if max(img.width, img.height) > max_size:
-                    ratio = max_size / max(img.width, img.height)
-                    new_width = int(img.width * ratio)
-                    new_height = int(img.height * ratio)
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                # Encoder en base64
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=85)
-                buffer.seek(0)
-                return base64.b64encode(buffer.read()).decode('utf-8')
-                
-        except Exception as e:
-            logger.error(f"Erreur lors de l'encodage de {image_path}: {e}")
-            return None
+        prepared = preprocess_image(str(image_path))
+        return prepared.image_url[len(JPEG_DATA_URL_PREFIX):] if prepared else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Ferme le client OpenAI, la session aiohttp et leurs pools de connexions HTTP"""
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+        await self.client.close()
+
+    async def create_chat_completion(self, request: Dict) -> str:
+        """
+        Envoie une requête chat.completions et retourne le texte de la réponse
+        
+        Args:
+            request: Paramètres de la requête (build_vision_request / build_multi_image_request)
+        
+        Returns:
+            str: Contenu du message renvoyé par le modèle
+        """
+        if not self.direct_http:
+            response = await self.client.chat.completions.create(**request)
+            return response.choices[0].message.content.strip()
+        
+        if self._http_session is None:
+            self._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300),
+                headers={'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'},
+                timeout=aiohttp.ClientTimeout(total=120, connect=10)
+            )
+        
+        body = json_dumps(request)
+        url = f"{self.base_url}/chat/completions"
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._http_session.post(url, data=body) as response:
+                    if response.status == 200:
+                        data = json_loads(await response.read())
+                        return data['choices'][0]['message']['content'].strip()
+                    
+                    error = await response.text()
+                    if response.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                        raise RuntimeError(f"HTTP {response.status}: {error[:200]}")
+                    retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                retry_after = None
+            
+            # Backoff exponentiel (ou délai imposé par Retry-After)
+            try:
+                delay = float(retry_after) if retry_after else min(2 ** attempt, 30)
+            except ValueError:
+                delay = min(2 ** attempt, 30)
+            logger.warning(f"⏳ Appel Vision relancé dans {delay:.1f}s (tentative {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    def list_image_files(self) -> List[Path]:
+        """Liste les images à analyser (voir list_image_files)"""
+        return list_image_files(self.images_dir)
 
-    def analyze_all_tables_with_vision(self, image_path: Path) -> Tuple[str, List[Dict]]:
+    async def preprocess(self, image_path: Path) -> Optional[PreparedImage]:
+        """Exécute preprocess_image dans le pool de prétraitement (pool de threads par défaut hors aprocess_all_images)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, preprocess_image, str(image_path))
+
+    async def hash_files(self, image_paths: List[Path]) -> List[str]:
+        """Empreintes (file_hash) de plusieurs images en parallèle dans le pool de prétraitement (hashlib relâche le GIL)"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *(loop.run_in_executor(self._pool, file_hash, str(path)) for path in image_paths)
+        )
+
+    async def group_duplicate_images(self, image_files: List[Path]) -> Dict[Path, Path]:
+        """
+        Regroupe les images quasi identiques par hash perceptuel (pHash)
+        
+        Args:
+            image_files: Images à analyser
+        
+        Returns:
+            Dict[Path, Path]: Image représentante de chaque image (elle-même si pas de doublon)
+        """
+        if not HAS_IMAGEHASH:
+            return {path: path for path in image_files}
+        
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(
+            *(loop.run_in_executor(self._pool, perceptual_hash, str(path)) for path in image_files)
+        )
+        
+        representative_of = {}
+        groups = []  # (pHash, image représentante)
+        for path, hex_hash in zip(image_files, hashes):
+            representative_of[path] = path
+            if hex_hash is None:
+                continue
+            
+            phash = imagehash.hex_to_hash(hex_hash)
+            for group_hash, representative in groups:
+                if phash - group_hash <= self.dedup_max_distance:
+                    representative_of[path] = representative
+                    logger.info(f"♻️ {path.name} identique à {representative.name}, réponse IA réutilisée")
+                    break
+            else:
+                groups.append((phash, path))
+        
+        return representative_of
+
+    async def analyze_all_tables_with_vision(self, image_path: Path) -> Tuple[str, List[Dict]]:
         """Analyse tous les tableaux dans une image avec GPT-4 Vision"""
         try:
             logger.info(f"🤖 Analyse IA complète de {image_path.name}")
             
-            # Encoder l'image
-            base64_image = self.encode_image_to_base64(image_path)
-            if not base64_image:
+            # Image déjà analysée (même contenu): ni prétraitement ni appel à l'API
+            image_hash, = await self.hash_files([image_path])
+            cached_tables = self.vision_cache.get(image_hash)
+            if cached_tables is not None:
+                logger.info(f"💾 Réponse IA en cache pour {image_path.name}")
+                return None, cached_tables
+            
+            # Décoder, rogner et encoder l'image (CPU) hors de la boucle d'événements
+            prepared = await self.preprocess(image_path)
+            if prepared is None:
                 return None, []
             
-            # Prompt universel pour détecter tous les types de tableaux
-            system_prompt = """Tu es un expert en analyse de tableaux pour le serveur de jeu FlashBack FA.
+            logger.info(f"📐 {image_path.name}: {prepared.width}x{prepared.height}, "
+                        f"{(len(prepared.image_url_low) - len(JPEG_DATA_URL_PREFIX)) * 3 // 4} octets JPEG envoyés en détail bas")
+            
+            # Premier passage en détail "low" (~85 tokens image au lieu de ~765), image réduite à 512 px
+            tables = await self.request_tables(prepared.image_url_low, image_path.name, detail="low")
+            self.vision_stats['low'] += 1
+            
+            # Escalade en détail "high" si la lecture basse résolution est inexploitable
+            if self.needs_high_detail(tables):
+                self.vision_stats['escalated'] += 1
+                logger.info(f"🔍 Lecture incomplète de {image_path.name}, nouvelle analyse en détail élevé")
+                tables = await self.request_tables(prepared.image_url, image_path.name, detail="high")
+            
+            if tables is None:
+                return None, []
+            
+            self.vision_cache.put(image_hash, tables)
+            return None, tables # None: table_type non utilisé ici
+                
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'analyse IA de {image_path}: {e}")
+            return None, []
+
+    async def analyze_images_with_vision(self, image_paths: List[Path]) -> List[Tuple[str, List[Dict]]]:
+        """
+        Analyse plusieurs images en un seul appel GPT-4 Vision (détail "low")
+        
+        Les images en cache ne sont pas renvoyées; une image dont la lecture groupée est
+        inexploitable est relancée seule en détail "high".
+        
+        Returns:
+            List[Tuple[str, List[Dict]]]: (None, tableaux) pour chaque image, dans l'ordre reçu
+        """
+        results = [(None, [])] * len(image_paths)
+        
+        # Images déjà analysées (même contenu): ni prétraitement ni appel à l'API
+        image_hashes = await self.hash_files(image_paths)
+        pending = []
+        for position, (image_path, image_hash) in enumerate(zip(image_paths, image_hashes)):
+            cached_tables = self.vision_cache.get(image_hash)
+            if cached_tables is not None:
+                logger.info(f"💾 Réponse IA en cache pour {image_path.name}")
+                results[position] = (None, cached_tables)
+            else:
+                pending.append(position)
+        
+        prepared_images = await asyncio.gather(*(self.preprocess(image_paths[position]) for position in pending))
+        pending = [(position, prepared) for position, prepared in zip(pending, prepared_images) if prepared is not None]
+        if not pending:
+            return results
+        
+        image_names = [image_paths[position].name for position, _ in pending]
+        request = self.build_multi_image_request([prepared.image_url_low for _, prepared in pending], detail="low")
+        try:
+            content = await self.create_chat_completion(request)
+            logger.info(f"🤖 Réponse IA brute groupée (low): {content[:200]}...")
+            tables_per_image = self.parse_multi_tables_response(content, image_names)
+            grouped = True
+        except Exception as e:
+            # Appel groupé en échec: chaque image repart seule (détail "low" puis escalade éventuelle)
+            logger.warning(f"⚠️ Échec de l'appel groupé ({', '.join(image_names)}): {e} - analyse image par image")
+            tables_per_image = [None] * len(pending)
+            grouped = False
+        self.vision_stats['low'] += len(pending)
+        
+        for (position, prepared), tables in zip(pending, tables_per_image):
+            image_path = image_paths[position]
+            
+            try:
+                if not grouped:
+                    tables = await self.request_tables(prepared.image_url_low, image_path.name, detail="low")
+                
+                # Escalade individuelle en détail "high" si la lecture groupée est inexploitable
+                if self.needs_high_detail(tables):
+                    self.vision_stats['escalated'] += 1
+                    logger.info(f"🔍 Lecture incomplète de {image_path.name}, nouvelle analyse en détail élevé")
+                    tables = await self.request_tables(prepared.image_url, image_path.name, detail="high")
+            except Exception as e:
+                logger.error(f"❌ Erreur lors de l'analyse IA de {image_path}: {e}")
+                continue
+            
+            if tables is not None:
+                self.vision_cache.put(image_hashes[position], tables)
+                results[position] = (None, tables)
+        
+        return results
+
+    async def request_tables(self, image_url: str, image_name: str, detail: str) -> Optional[List]:
+        """Appelle GPT-4 Vision pour une image et retourne les tableaux parsés (None si inexploitables)"""
+        # Appel à l'API OpenAI GPT-4 Vision
+        content = await self.create_chat_completion(self.build_vision_request(image_url, detail))
+        logger.info(f"🤖 Réponse IA brute ({detail}): {content[:200]}...")
+        
+        return self.parse_tables_response(content, image_name)
+
+    def needs_high_detail(self, tables: Optional[List]) -> bool:
+        """
+        Indique si une réponse en détail "low" doit être refaite en détail "high"
+        
+        Escalade si le JSON est inexploitable, ou si des tableaux ont été détectés mais
+        qu'au moins une ligne a moins de 2 cellules renseignées.
+        """
+        if tables is None:
+            return True
+        
+        for table in tables:
+            rows = table.get('data', []) if isinstance(table, dict) else table
+            if not isinstance(rows, list):
+                return True
+            for row in rows:
+                if not isinstance(row, dict):
+                    return True
+                if sum(1 for value in row.values() if value is not None and str(value).strip()) < 2:
+                    return True
+        return False
+
+    def build_vision_request(self, image_url: str, detail: str = "high") -> Dict:
+        """
+        Construit les paramètres d'un appel chat.completions GPT-4 Vision pour une image
+        
+        Args:
+            image_url: Image JPEG en data URL (base64)
+            detail: Niveau de détail de l'image ("low" ou "high")
+        
+        Returns:
+            Dict: Paramètres de la requête (aussi utilisés comme corps des requêtes Batch API)
+        """
+        # Prompt universel pour détecter tous les types de tableaux
+        system_prompt = """Tu es un expert en analyse de tableaux pour le serveur de jeu FlashBack FA.
 
             Ton rôle est d'identifier et extraire TOUS les tableaux visibles dans l'image, quel que soit leur type (armes, véhicules, objets, immobilier, emplois, etc.).
 
@@ -112,23 +806,27 @@ class UniversalTableExtractorAI:
             3. Extrait TOUTES les données de chaque tableau
             4. Conserve la structure et les colonnes exactes de chaque tableau
             5. Les symboles ✓/✗ ou coches/croix = "autoriser"/"interdit"
-            6. Retourne un JSON avec la structure suivante:
+            6. Retourne un objet JSON avec la structure suivante:
 
             {
-              "table_type": "nom_du_type_de_tableau",
-              "data": [
+              "tables": [
                 {
-                  "colonne1": "valeur1",
-                  "colonne2": "valeur2",
-                  ...
+                  "table_type": "nom_du_type_de_tableau",
+                  "data": [
+                    {
+                      "colonne1": "valeur1",
+                      "colonne2": "valeur2",
+                      ...
+                    }
+                  ]
                 }
               ]
             }
 
-            Si plusieurs tableaux sont détectés, retourne une liste de ces objets.
-            Si aucun tableau détecté, retourne une liste vide []."""
-            
-            user_prompt = """Analyse cette image FlashBack FA et extrait TOUS les tableaux visibles.
+            Si plusieurs tableaux sont détectés, ajoute-les tous dans la liste "tables".
+            Si aucun tableau détecté, retourne {"tables": []}."""
+        
+        user_prompt = """Analyse cette image FlashBack FA et extrait TOUS les tableaux visibles.
 
             Pour chaque tableau trouvé:
             1. Identifie son type (armes, véhicules, objets, etc.)
@@ -136,256 +834,570 @@ class UniversalTableExtractorAI:
             3. Conserve tous les noms de colonnes exactement comme dans l'image
             4. Convertis les symboles ✓/✗ en "autoriser"/"interdit"
 
-            Retourne UNIQUEMENT un JSON valide avec cette structure:
-            [
-              {
-                "table_type": "type_du_tableau",
-                "data": [
-                  {"colonne1": "valeur1", "colonne2": "valeur2", ...}
-                ]
-              }
-            ]
-
-            N'ajoute AUCUN texte avant ou après le JSON."""
-            
-            # Appel à l'API OpenAI GPT-4 Vision
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": user_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
+            Retourne UNIQUEMENT un objet JSON valide avec cette structure:
+            {
+              "tables": [
+                {
+                  "table_type": "type_du_tableau",
+                  "data": [
+                    {"colonne1": "valeur1", "colonne2": "valeur2", ...}
+                  ]
+                }
+              ]
+            }"""
+        
+        return {
+            "model": VISION_MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": user_prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url,
+                                "detail": detail
                             }
-                        ]
+                        }
+                    ]
+                }
+            ],
+            # Mode JSON: la réponse est toujours un objet JSON valide, sans texte autour
+            "response_format": {"type": "json_object"},
+            "max_tokens": 4000,
+            "temperature": 0.1
+        }
+
+    def build_multi_image_request(self, image_urls: List[str], detail: str = "low") -> Dict:
+        """
+        Construit un appel GPT-4 Vision portant sur plusieurs images
+        
+        Même prompt système que build_vision_request; chaque image est précédée d'un
+        repère IMAGE_i et la réponse attendue regroupe les tableaux par image_index.
+        
+        Args:
+            image_urls: Images JPEG en data URL (base64)
+            detail: Niveau de détail des images ("low" ou "high")
+        
+        Returns:
+            Dict: Paramètres de la requête chat.completions
+        """
+        request = self.build_vision_request(image_urls[0], detail)
+        
+        # Prompt système propre à l'appel groupé: celui de build_vision_request impose {"tables": [...]}
+        request["messages"][0]["content"] = """Tu es un expert en analyse de tableaux pour le serveur de jeu FlashBack FA.
+
+            Tu reçois PLUSIEURS images, chacune précédée de son repère IMAGE_0, IMAGE_1, etc.
+            Ton rôle est d'identifier et extraire TOUS les tableaux visibles dans CHAQUE image, quel que soit leur type (armes, véhicules, objets, immobilier, emplois, etc.).
+
+            INSTRUCTIONS:
+            1. Examine chaque image séparément, sans mélanger leurs tableaux
+            2. Pour chaque tableau trouvé, détermine son TYPE (ex: "armes", "véhicules", "objets", "immobilier", "emplois")
+            3. Extrait TOUTES les données de chaque tableau
+            4. Conserve la structure et les colonnes exactes de chaque tableau
+            5. Les symboles ✓/✗ ou coches/croix = "autoriser"/"interdit"
+            6. Retourne un objet JSON avec la structure suivante:
+
+            {
+              "images": [
+                {
+                  "image_index": 0,
+                  "tables": [
+                    {
+                      "table_type": "nom_du_type_de_tableau",
+                      "data": [
+                        {
+                          "colonne1": "valeur1",
+                          "colonne2": "valeur2",
+                          ...
+                        }
+                      ]
                     }
-                ],
-                max_tokens=4000,
-                temperature=0.1
-            )
-            
-            # Extraire la réponse
-            content = response.choices[0].message.content.strip()
-            logger.info(f"🤖 Réponse IA brute: {content[:200]}...")
-            
-            # Parser le JSON
-            try:
-                tables = json.loads(content)
-                if isinstance(tables, list):
-                    logger.info(f"✅ {len(tables)} tableaux détectés par l'IA dans {image_path.name}")
-                    return None, tables # Return None for table_type as it's not directly used here
-                else:
-                    logger.warning(f"⚠️ Réponse IA non valide pour {image_path.name}: pas une liste")
-                    return None, []
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Erreur JSON pour {image_path.name}: {e}")
-                logger.error(f"Contenu reçu: {content}")
-                
-                # Tentative de nettoyage du JSON
-                cleaned_content = self.clean_json_response(content)
-                if cleaned_content:
-                    try:
-                        tables = json.loads(cleaned_content)
-                        if isinstance(tables, list):
-                            logger.info(f"✅ JSON nettoyé: {len(tables)} tableaux détectés")
-                            return None, tables
-                    except:
-                        pass
-                
-                return None, []
-                
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de l'analyse IA de {image_path}: {e}")
-            return None, []
+                  ]
+                }
+              ]
+            }
+
+            Une entrée par image reçue (image_index = numéro du repère IMAGE_i).
+            Si une image ne contient aucun tableau, son entrée a "tables": []."""
+        
+        content = [{
+            "type": "text",
+            "text": f"""Analyse ces {len(image_urls)} images FlashBack FA et extrait TOUS les tableaux visibles dans chacune.
 
-    def clean_json_response(self, content: str) -> Optional[str]:
-        """Nettoie la réponse IA pour extraire le JSON valide"""
+            Chaque image est précédée de son repère IMAGE_0, IMAGE_1, etc.
+            Pour chaque image, applique les mêmes règles d'extraction qu'habituellement
+            (type du tableau, données ligne par ligne, noms de colonnes exacts, ✓/✗ en "autoriser"/"interdit").
+
+            Retourne UNIQUEMENT un objet JSON valide avec cette structure:
+            {{
+              "images": [
+                {{
+                  "image_index": 0,
+                  "tables": [
+                    {{
+                      "table_type": "type_du_tableau",
+                      "data": [
+                        {{"colonne1": "valeur1", "colonne2": "valeur2", ...}}
+                      ]
+                    }}
+                  ]
+                }}
+              ]
+            }}
+
+            Une entrée par image, avec "tables": [] si l'image ne contient aucun tableau."""
+        }]
+        for index, image_url in enumerate(image_urls):
+            content.append({"type": "text", "text": f"IMAGE_{index}:"})
+            content.append({"type": "image_url", "image_url": {"url": image_url, "detail": detail}})
+        
+        request["messages"][1]["content"] = content
+        # Réponse plus longue: une liste de tableaux par image (plafond de sortie de gpt-4o)
+        request["max_tokens"] = min(request["max_tokens"] * len(image_urls), 16000)
+        return request
+
+    def parse_multi_tables_response(self, content: str, image_names: List[str]) -> List[Optional[List]]:
+        """
+        Parse une réponse groupée ({"images": [{"image_index": i, "tables": [...]}]})
+        
+        Returns:
+            List[Optional[List]]: Tableaux de chaque image, None si absents ou inexploitables
+        """
+        tables_per_image = [None] * len(image_names)
         try:
-            # Chercher le JSON entre crochets (liste)
-            json_match = re.search(r'\[.*\]', content, re.DOTALL)
-            if json_match:
-                return json_match.group(0)
-            
-            # Chercher le JSON entre accolades (objet unique)
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                return f"[{json_match.group(0)}]"
-            
+            images = json_loads(content)["images"]
+        except (json.JSONDecodeError, TypeError, KeyError) as e:
+            logger.error(f"❌ Erreur JSON pour {', '.join(image_names)}: {e}")
+            return tables_per_image
+        
+        for entry in images if isinstance(images, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get('image_index')
+            tables = entry.get('tables')
+            if isinstance(index, int) and 0 <= index < len(image_names) and isinstance(tables, list):
+                tables_per_image[index] = tables
+                logger.info(f"✅ {len(tables)} tableaux détectés par l'IA dans {image_names[index]}")
+        
+        return tables_per_image
+
+    def parse_tables_response(self, content: str, image_name: str) -> Optional[List]:
+        """
+        Parse la réponse JSON de l'IA ({"tables": [...]}) en liste de tableaux
+        
+        Args:
+            content: Objet JSON renvoyé par le modèle (mode json_object)
+            image_name: Nom de l'image analysée (pour les logs)
+        
+        Returns:
+            Optional[List]: Tableaux détectés, None si la réponse est inexploitable
+        """
+        try:
+            tables = json_loads(content)["tables"]
+        except (json.JSONDecodeError, TypeError, KeyError) as e:
+            # Seul cas restant en mode JSON: réponse tronquée par max_tokens
+            logger.error(f"❌ Erreur JSON pour {image_name}: {e}")
+            logger.error(f"Contenu reçu: {content}")
             return None
-            
-        except Exception as e:
-            logger.error(f"Erreur lors du nettoyage JSON: {e}")
+        
+        if not isinstance(tables, list):
+            logger.warning(f"⚠️ Réponse IA non valide pour {image_name}: \"tables\" n'est pas une liste")
             return None
+        
+        logger.info(f"✅ {len(tables)} tableaux détectés par l'IA dans {image_name}")
+        return tables
 
-    def normalize_table_data(self, table_data: List[Dict], table_type: str) -> List[Dict]:
-        """Normalise les données d'un tableau selon son type"""
-        normalized_data = []
+    async def analyze_batch_with_vision(self, image_files: List[Path],
+                                        poll_interval: float = 30.0) -> Dict[str, List]:
+        """
+        Analyse toutes les images via l'API Batch d'OpenAI (coût réduit, hors limites de débit en ligne)
         
-        for row in table_data:
-            normalized_row = {}
-            
-            # Normaliser chaque champ
-            for key, value in row.items():
-                # Nettoyer la clé
-                clean_key = str(key).strip()
-                clean_value = str(value).strip()
-                
-                # Normaliser les autorisations
-                if any(auth_word in clean_key.lower() for auth_word in ['indépendant', 'pf offi', 'gang', 'orga', 'autorisation']):
-                    if any(symbol in clean_value.lower() for symbol in ['✓', 'oui', 'yes', 'autoris', 'allow', 'permit']):
-                        clean_value = 'autoriser'
-                    elif any(symbol in clean_value.lower() for symbol in ['✗', '❌', 'non', 'no', 'interdit', 'forbid', 'deny']):
-                        clean_value = 'interdit'
-                
-                # Normaliser les prix
-                if any(price_word in clean_key.lower() for price_word in ['prix', 'price', 'coût', 'cost', 'revente']):
-                    if 'interdit' in clean_value.lower():
-                        clean_value = 'INTERDIT'
-                    else:
-                        price_match = re.search(r'(\d+)', clean_value.replace(' ', '').replace("'", ''))
-                        if price_match:
-                            price_num = price_match.group(1)
-                            if len(price_num) <= 3:
-                                clean_value = f"{price_num} 000$"
-                            else:
-                                clean_value = f"{price_num}$"
-                
-                # Normaliser les quantités/munitions
-                if any(qty_word in clean_key.lower() for qty_word in ['munitions', 'quantité', 'max', 'stock']):
-                    qty_match = re.search(r'(\d+)', clean_value)
-                    if qty_match:
-                        clean_value = qty_match.group(1)
-                
-                normalized_row[clean_key] = clean_value
+        Args:
+            image_files: Images à analyser
+            poll_interval: Intervalle entre deux vérifications du statut du batch (secondes)
+        
+        Returns:
+            Dict[str, List]: Tableaux détectés par nom d'image
+        """
+        tables_by_image = {}
+        image_hashes = {}
+        
+        # Toutes les empreintes calculées en parallèle, puis une seule passe sur le cache
+        pending = []
+        for image_path, image_hash in zip(image_files, await self.hash_files(image_files)):
+            cached_tables = self.vision_cache.get(image_hash)
+            if cached_tables is not None:
+                tables_by_image[image_path.name] = cached_tables
+            else:
+                pending.append((image_path, image_hash))
+        
+        # Une ligne JSONL par image non présente en cache, identifiée par son nom de fichier
+        # (prétraitement en parallèle par groupes, pour borner les data URLs gardées en mémoire)
+        batch_input = Path("batch_input.jsonl")
+        chunk_size = 4 * (os.cpu_count() or 1)
+        with open(batch_input, 'w', encoding='utf-8') as f:
+            for start in range(0, len(pending), chunk_size):
+                chunk = pending[start:start + chunk_size]
+                prepared_images = await asyncio.gather(*(self.preprocess(image_path) for image_path, _ in chunk))
+                for (image_path, image_hash), prepared in zip(chunk, prepared_images):
+                    if prepared is None:
+                        continue
+                    
+                    image_hashes[image_path.name] = image_hash
+                    f.write(json.dumps({
+                        "custom_id": image_path.name,
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": self.build_vision_request(prepared.image_url)
+                    }) + "\n")
+        
+        if not image_hashes:
+            logger.info("💾 Toutes les images sont en cache, aucun batch à soumettre")
+            return tables_by_image
+        
+        with open(batch_input, 'rb') as f:
+            input_file = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"📦 Batch {batch.id} soumis ({len(image_hashes)} images)")
+        
+        # Attendre la fin du batch
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+            logger.info(f"📦 Batch {batch.id}: {batch.status}")
+        
+        if batch.status != 'completed' or not batch.output_file_id:
+            logger.error(f"❌ Batch {batch.id} terminé avec le statut '{batch.status}'")
+            return tables_by_image
+        
+        # Associer chaque réponse à son image via custom_id
+        output = await self.client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            result = json_loads(line)
+            image_name = result.get('custom_id')
+            response = result.get('response') or {}
+            if response.get('status_code') != 200:
+                logger.error(f"❌ Erreur batch pour {image_name}: {result.get('error')}")
+                continue
+            content = response['body']['choices'][0]['message']['content'].strip()
+            tables = self.parse_tables_response(content, image_name)
+            if tables is None:
+                continue
             
+            self.vision_cache.put(image_hashes[image_name], tables)
+            tables_by_image[image_name] = tables
+        
+        return tables_by_image
+
+    def normalize_table_data(self, table_data: List[Dict], table_type: str) -> List[Dict]:
+        """Normalise les données d'un tableau selon son type (opérations vectorisées par colonne)"""
+        # Clés nettoyées, en conservant l'ordre des colonnes de chaque ligne
+        rows = [{str(key).strip(): value for key, value in row.items()} for row in table_data]
+        if not rows:
+            return []
+        
+        df = pd.DataFrame(rows, dtype=object)
+        if df.empty:
+            return []
+        
+        values = df.apply(lambda column: column.map(str).str.strip())
+        
+        # Classer les colonnes une seule fois
+        lower_columns = df.columns.str.lower()
+        auth_columns = df.columns[lower_columns.str.contains(_AUTH_COLUMN_RE)]
+        price_columns = df.columns[lower_columns.str.contains(_PRICE_COLUMN_RE)]
+        qty_columns = df.columns[lower_columns.str.contains(_QTY_COLUMN_RE)]
+        
+        # Normaliser les autorisations
+        for col in auth_columns:
+            lowered = values[col].str.lower()
+            allowed = lowered.str.contains(_ALLOWED_RE)
+            forbidden = lowered.str.contains(_FORBIDDEN_RE)
+            values[col] = values[col].mask(allowed, 'autoriser').mask(~allowed & forbidden, 'interdit')
+        
+        # Normaliser les prix
+        for col in price_columns:
+            forbidden = values[col].str.lower().str.contains('interdit', regex=False)
+            digits = (values[col].str.replace(' ', '', regex=False)
+                      .str.replace("'", '', regex=False)
+                      .str.extract(_DIGITS_RE, expand=False))
+            formatted = (digits + ' 000$').where(digits.str.len() <= 3, digits + '$')
+            values[col] = values[col].where(digits.isna(), formatted).mask(forbidden, 'INTERDIT')
+        
+        # Normaliser les quantités/munitions
+        for col in qty_columns:
+            digits = values[col].str.extract(_DIGITS_RE, expand=False)
+            values[col] = values[col].where(digits.isna(), digits)
+        
+        # Chaque ligne ne reprend que ses propres colonnes (les autres sont des NaN de pandas)
+        normalized_data = []
+        for row, normalized in zip(rows, values.to_dict('records')):
+            normalized_row = {key: normalized[key] for key in row}
             if normalized_row:  # Ajouter seulement si on a des données
                 normalized_data.append(normalized_row)
         
         return normalized_data
 
-    def process_all_images(self) -> Dict[str, pd.DataFrame]:
-        """Traite toutes les images et retourne UN DataFrame par image avec organisation parfaite"""
-        logger.info(f"🤖 Analyse IA - UN dataset par image dans {self.images_dir}")
-        
-        dataframes_by_image = {}
-        processed_count = 0
+    def build_image_dataframe(self, image_path: Path, tables: List) -> Optional[pd.DataFrame]:
+        """
+        Construit le DataFrame d'une image à partir des tableaux renvoyés par l'IA
         
-        # Traiter chaque image individuellement
-        image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp', '*.webp']
-        image_files = []
+        Args:
+            image_path: Image analysée (utilisée pour la colonne Source_Image)
+            tables: Tableaux détectés par analyze_all_tables_with_vision
         
-        # Collecter toutes les images et les trier
-        for ext in image_extensions:
-            image_files.extend(self.images_dir.glob(ext))
+        Returns:
+            Optional[pd.DataFrame]: DataFrame dédoublonné, ou None si aucune donnée
+        """
+        if not tables:
+            return None
         
-        # Trier les images par nom pour un ordre cohérent
-        image_files.sort(key=lambda x: x.name)
+        # Collecter toutes les données de cette image
+        all_image_data = []
+        item_keys = []
+        source_image = image_path.name
         
-        for image_index, image_path in enumerate(image_files, 1):
-            logger.info(f"📷 Analyse IA de {image_path.name} ({image_index}/{len(image_files)})")
-            
-            # Analyser avec GPT-4 Vision
-            table_type, tables = self.analyze_all_tables_with_vision(image_path)
+        for table_index, table in enumerate(tables):
+            if isinstance(table, dict):
+                table_data = table.get('data', [])
+                detected_type = table.get('table_type', 'tableau').lower()
+            else:
+                # Si c'est directement une liste
+                table_data = table if isinstance(table, list) else []
+                detected_type = 'tableau'
             
-            if tables:
-                # Collecter toutes les données de cette image
-                all_image_data = []
+            if table_data:
+                # Normaliser les données de ce tableau
+                normalized_data = self.normalize_table_data(table_data, detected_type)
                 
-                for table_index, table in enumerate(tables):
-                    if isinstance(table, dict):
-                        table_data = table.get('data', [])
-                        detected_type = table.get('table_type', 'tableau').lower()
-                    else:
-                        # Si c'est directement une liste
-                        table_data = table if isinstance(table, list) else []
-                        detected_type = 'tableau'
+                if normalized_data:
+                    table_type_label = detected_type.capitalize()
                     
-                    if table_data:
-                        # Normaliser les données de ce tableau
-                        normalized_data = self.normalize_table_data(table_data, detected_type)
+                    # Ajouter chaque élément avec métadonnées
+                    for item in normalized_data:
+                        # Garder seulement les colonnes qui ont des valeurs (chaque valeur nettoyée une seule fois)
+                        clean_item = {key: text for key, value in item.items() if value and (text := str(value).strip())}
                         
-                        if normalized_data:
-                            # Ajouter chaque élément avec métadonnées
-                            for item in normalized_data:
-                                # Nettoyer l'item - garder seulement les colonnes utiles
-                                clean_item = {}
-                                
-                                # Garder seulement les colonnes qui ont des valeurs
-                                for key, value in item.items():
-                                    if value and str(value).strip():
-                                        clean_item[key] = str(value).strip()
-                                
-                                # Ajouter les métadonnées si l'item a du contenu
-                                if clean_item:
-                                    clean_item['Table_Type'] = detected_type.capitalize()
-                                    clean_item['Source_Image'] = image_path.name
-                                    all_image_data.append(clean_item)
-                            
-                            logger.info(f"  ✅ Tableau '{detected_type}': {len(normalized_data)} éléments")
-                
-                # Créer un DataFrame pour cette image si on a des données
-                if all_image_data:
-                    # Nom propre et organisé pour ce dataset
-                    dataset_name = f"image_{image_index:02d}"
-                    
-                    # Supprimer les doublons dans cette image
-                    unique_items = []
-                    seen_items = set()
-                    
-                    for item in all_image_data:
-                        # Utiliser les premières valeurs significatives comme clé unique
-                        key_values = []
-                        for key, value in item.items():
-                            if key not in ['Table_Type', 'Source_Image'] and value and str(value).strip():
-                                key_values.append(str(value).lower().strip())
-                                if len(key_values) >= 2:  # Utiliser 2 valeurs pour la clé
-                                    break
-                        
-                        item_key = '|'.join(key_values) if key_values else str(len(unique_items))
-                        
-                        if item_key not in seen_items:
-                            unique_items.append(item)
-                            seen_items.add(item_key)
+                        # Ajouter les métadonnées si l'item a du contenu
+                        if clean_item:
+                            # Clé de dédoublonnage: 2 premières valeurs, en minuscules
+                            item_keys.append('|'.join(value.lower() for value in islice(clean_item.values(), 2)))
+                            clean_item['Table_Type'] = table_type_label
+                            clean_item['Source_Image'] = source_image
+                            all_image_data.append(clean_item)
                     
-                    if unique_items:
-                        # Créer le DataFrame pour cette image
-                        df = pd.DataFrame(unique_items)
-                        
-                        # Réorganiser les colonnes : données importantes d'abord, métadonnées à la fin
-                        priority_columns = []
-                        regular_columns = []
-                        meta_columns = []
-                        
-                        for col in df.columns:
-                            if col in ['Table_Type', 'Source_Image']:
-                                meta_columns.append(col)
-                            elif any(priority in col.upper() for priority in ['ARME', 'NOM', 'OBJET', 'VEHICULE']):
-                                priority_columns.append(col)
-                            else:
-                                regular_columns.append(col)
-                        
-                        # Nouvelle organisation des colonnes
-                        new_column_order = priority_columns + regular_columns + meta_columns
-                        df = df[new_column_order]
-                        
-                        dataframes_by_image[dataset_name] = df
-                        logger.info(f"🎯 Dataset créé '{dataset_name}': {len(df)} éléments uniques")
+                    logger.info(f"  ✅ Tableau '{detected_type}': {len(normalized_data)} éléments")
+        
+        # Créer un DataFrame pour cette image si on a des données
+        if not all_image_data:
+            return None
+        
+        # Supprimer les doublons dans cette image (clés calculées à la collecte, dédoublonnées par pandas)
+        keep = ~pd.Series(item_keys).duplicated().to_numpy()
+        df = pd.DataFrame([item for item, kept in zip(all_image_data, keep) if kept])
+        
+        # Réorganiser les colonnes : données importantes d'abord, métadonnées à la fin
+        meta_columns = [col for col in df.columns if col in META_COLUMNS]
+        data_columns = [col for col in df.columns if col not in META_COLUMNS]
+        priority_columns = [col for col in data_columns
+                            if any(priority in col.upper() for priority in PRIORITY_COLUMNS)]
+        regular_columns = [col for col in data_columns if col not in priority_columns]
+        
+        return df[priority_columns + regular_columns + meta_columns]
+
+    async def aprocess_all_images(self, batch: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        Traite toutes les images (appels IA concurrents) et retourne UN DataFrame par image avec organisation parfaite
+        
+        Args:
+            batch: Passer par l'API Batch d'OpenAI plutôt que par des appels en ligne (gros volumes)
+        """
+        logger.info(f"🤖 Analyse IA - UN dataset par image dans {self.images_dir}")
+        
+        # Traiter chaque image individuellement
+        image_files = self.list_image_files()
+        
+        self._pool = self.create_preprocess_pool()
+        try:
+            # Un seul appel Vision par groupe d'images quasi identiques
+            representative_of = await self.group_duplicate_images(image_files)
+            representatives = list(dict.fromkeys(representative_of.values()))
+            if len(representatives) < len(image_files):
+                logger.info(f"♻️ {len(image_files) - len(representatives)} doublons détectés, {len(representatives)} images envoyées à l'IA")
+            
+            if batch:
+                # Une seule soumission Batch API pour toutes les images
+                tables_by_image = await self.analyze_batch_with_vision(representatives)
+                results = [(None, tables_by_image.get(path.name, [])) for path in representatives]
+            elif self.images_per_request > 1:
+                # Plusieurs images par appel: prompt système et aller-retour HTTP partagés
+                semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+                size = self.images_per_request
+                chunks = [representatives[start:start + size] for start in range(0, len(representatives), size)]
+                
+                async def analyze_chunk_with_semaphore(chunk: List[Path]):
+                    async with semaphore:
+                        logger.info(f"📷 Analyse IA groupée de {len(chunk)} images ({', '.join(path.name for path in chunk)})")
+                        return await self.analyze_images_with_vision(chunk)
+                
+                chunk_results = await asyncio.gather(
+                    *(analyze_chunk_with_semaphore(chunk) for chunk in chunks),
+                    return_exceptions=True
+                )
+                results = []
+                for chunk, chunk_result in zip(chunks, chunk_results):
+                    results.extend([chunk_result] * len(chunk) if isinstance(chunk_result, BaseException) else chunk_result)
+            else:
+                # Appels GPT-4 Vision en parallèle, bornés par un semaphore
+                semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+                
+                async def analyze_with_semaphore(image_index: int, image_path: Path):
+                    async with semaphore:
+                        logger.info(f"📷 Analyse IA de {image_path.name} ({image_index}/{len(representatives)})")
+                        return await self.analyze_all_tables_with_vision(image_path)
                 
-            processed_count += 1
+                results = await asyncio.gather(
+                    *(analyze_with_semaphore(index, path) for index, path in enumerate(representatives, 1)),
+                    return_exceptions=True
+                )
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+        
+        # Les doublons reprennent les tableaux de leur image représentante
+        result_by_image = dict(zip(representatives, results))
+        results = [result_by_image[representative_of[path]] for path in image_files]
+        
+        return self.build_dataframes(image_files, results)
+
+    async def aprocess_image_queue(self, queue: asyncio.Queue) -> Dict[str, pd.DataFrame]:
+        """
+        Analyse les images au fil de leur arrivée dans une file, jusqu'à la sentinelle None
+        
+        Pendant du scraper (producteur): les appels Vision se recouvrent avec les téléchargements.
+        Les doublons exacts sont déjà écartés par le scraper, pas de regroupement perceptuel ici.
+        La file n'est lue que lorsqu'un appel Vision peut partir: avec une file bornée, un extracteur
+        saturé fait patienter le scraper au lieu d'accumuler les images en attente.
+        
+        Args:
+            queue: File des chemins d'images sauvegardées (None pour terminer), toujours
+                consommée jusqu'à la sentinelle, même en cas d'erreur ou d'annulation
+        
+        Returns:
+            Dict[str, pd.DataFrame]: Un DataFrame par image, comme aprocess_all_images
+        """
+        logger.info("🤖 Analyse IA des images au fil du scraping")
+        
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        
+        async def analyze_chunk(chunk: List[Path]):
+            try:
+                if len(chunk) == 1:
+                    logger.info(f"📷 Analyse IA de {chunk[0].name}")
+                    return [await self.analyze_all_tables_with_vision(chunk[0])]
+                logger.info(f"📷 Analyse IA groupée de {len(chunk)} images ({', '.join(path.name for path in chunk)})")
+                return await self.analyze_images_with_vision(chunk)
+            finally:
+                semaphore.release()
+        
+        chunks, tasks = [], []
+        finished = False
+        self._pool = self.create_preprocess_pool()
+        try:
+            while not finished:
+                # Attendre un créneau d'appel libre avant de retirer des images de la file
+                await semaphore.acquire()
+                chunk = []
+                while len(chunk) < self.images_per_request:
+                    image_path = await queue.get()
+                    if image_path is None:
+                        finished = True
+                        break
+                    chunk.append(Path(image_path))
+                
+                if not chunk:
+                    semaphore.release()
+                    break
+                chunks.append(chunk)
+                tasks.append(asyncio.create_task(analyze_chunk(chunk)))
+            chunk_results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if not finished:
+                # Arrêt anticipé (erreur, annulation): vider la file jusqu'à la sentinelle,
+                # sinon le scraper reste bloqué sur la file bornée
+                while await queue.get() is not None:
+                    pass
+            self._pool.shutdown()
+            self._pool = None
+        
+        results_by_image = {}
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            chunk_result = [chunk_result] * len(chunk) if isinstance(chunk_result, BaseException) else chunk_result
+            results_by_image.update(zip(chunk, chunk_result))
+        
+        # Même ordre que list_image_files (noms de datasets stables d'une exécution à l'autre)
+        image_files = sorted(results_by_image, key=lambda path: path.name)
+        return self.build_dataframes(image_files, [results_by_image[path] for path in image_files])
+
+    def create_preprocess_pool(self) -> concurrent.futures.Executor:
+        """
+        Crée le pool de prétraitement PIL/OpenCV, qui se recouvre avec les appels Vision en cours
+        
+        Threads par défaut (OpenCV et Pillow relâchent le GIL pendant décodage, redimensionnement
+        et encodage); processus en option, au prix du démarrage des workers et de la copie des data URLs
+        """
+        if self.preprocess_in_processes:
+            return concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+        return concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+    def build_dataframes(self, image_files: List[Path], results: List) -> Dict[str, pd.DataFrame]:
+        """
+        Construit un DataFrame par image à partir des résultats de l'analyse IA
+        
+        Args:
+            image_files: Images analysées, dans l'ordre des datasets
+            results: (texte, tableaux) ou exception, un par image
+        
+        Returns:
+            Dict[str, pd.DataFrame]: Datasets nommés image_01, image_02, ...
+        """
+        dataframes_by_image = {}
+        
+        # Construire les DataFrames dans l'ordre des images (noms de datasets stables)
+        for image_index, (image_path, result) in enumerate(zip(image_files, results), 1):
+            if isinstance(result, BaseException):
+                logger.error(f"❌ Erreur lors de l'analyse IA de {image_path}: {result}")
+                continue
+            
+            _, tables = result
+            df = self.build_image_dataframe(image_path, tables)
+            if df is not None:
+                # Nom propre et organisé pour ce dataset
+                dataset_name = f"image_{image_index:02d}"
+                dataframes_by_image[dataset_name] = df
+                logger.info(f"🎯 Dataset créé '{dataset_name}': {len(df)} éléments uniques")
+        
+        if self.vision_stats['low']:
+            escalation_rate = self.vision_stats['escalated'] / self.vision_stats['low'] * 100
+            logger.info(f"🔍 Escalades en détail élevé: {self.vision_stats['escalated']}/{self.vision_stats['low']} ({escalation_rate:.0f}%)")
         
         if not dataframes_by_image:
             logger.warning("❌ Aucun dataset créé - aucun tableau détecté")
@@ -396,6 +1408,69 @@ class UniversalTableExtractorAI:
         
         return dataframes_by_image
 
+    def process_all_images(self, batch: bool = False) -> Dict[str, pd.DataFrame]:
+        """Version synchrone de aprocess_all_images (à appeler hors d'une boucle d'événements)"""
+        async def run():
+            async with self:
+                return await self.aprocess_all_images(batch=batch)
+        
+        return asyncio.run(run())
+
+    def write_dataset(self, dataset_name: str, df: pd.DataFrame, output_dir: Path, timestamp: str) -> Path:
+        """
+        Écrit un dataset en code Python dans output_dir
+        
+        Returns:
+            Path: Fichier Python généré
+        """
+        # Nom de fichier propre et organisé
+        clean_dataset_name = f"dataset_{dataset_name}"
+        
+        # Export Python code avec nommage parfait
+        py_file = output_dir / f"flashback_{clean_dataset_name}_data.py"
+        
+        # Variables avec noms propres et cohérents
+        var_name = f"{clean_dataset_name}_data"
+        df_name = f"{clean_dataset_name}_df"
+        
+        # En-tête et pied de fichier assemblés en une seule chaîne chacun
+        header = (
+            "import pandas as pd\n\n"
+            f"# Dataset FlashBack FA - {dataset_name}\n"
+            "# Extrait par IA GPT-4 Vision depuis l'image correspondante\n"
+            "# DÉTECTION AUTOMATIQUE PAR INTELLIGENCE ARTIFICIELLE\n"
+            f"# Timestamp: {timestamp}\n"
+            f"# Total éléments: {len(df)}\n\n"
+            f"{var_name} = {df_name} = pd.DataFrame([\n    "
+        )
+        
+        footer = (
+            "\n])\n\n"
+            # Exemples d'utilisation
+            "# Utilisation:\n"
+            f"# from flashback_dataframes.flashback_{clean_dataset_name}_data import {var_name}, {df_name}\n"
+            f"# print({df_name}.head())\n"
+            f"# print(f'{{len({df_name})}} éléments dans ce dataset')\n\n"
+            # Statistiques du dataset
+            "# Statistiques du dataset:\n"
+            f"# - Nombre d'éléments: {len(df)}\n"
+            f"# - Colonnes: {list(df.columns)}\n"
+        )
+        
+        # Types de tableaux détectés
+        if 'Table_Type' in df.columns:
+            table_types = df['Table_Type'].value_counts().to_dict()
+            footer += f"# - Types détectés: {dict(table_types)}\n"
+        
+        # Un dict JSON par ligne (orjson si disponible, déjà en UTF-8): syntaxe Python valide,
+        # échappement complet des valeurs
+        records = df.astype(str).where(df.notna(), "").to_dict('records')
+        body = b",\n    ".join(json_dumps(record) for record in records)
+        
+        # Fichier écrit en binaire et en une seule fois
+        py_file.write_bytes(b"".join((header.encode('utf-8'), body, footer.encode('utf-8'))))
+        return py_file
+
     def export_all_dataframes(self, dataframes: Dict[str, pd.DataFrame]):
         """Exporte tous les DataFrames en code Python avec nommage parfait - 1 dataset par image"""
         try:
@@ -405,59 +1480,19 @@ class UniversalTableExtractorAI:
             
             timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
             
-            for dataset_name, df in dataframes.items():
-                if not df.empty:
-                    # Nom de fichier propre et organisé
-                    clean_dataset_name = f"dataset_{dataset_name}"
-                    
-                    # Export Python code avec nommage parfait
-                    py_file = output_dir / f"flashback_{clean_dataset_name}_data.py"
-                    with open(py_file, 'w', encoding='utf-8') as f:
-                        f.write("import pandas as pd\n\n")
-                        f.write(f"# Dataset FlashBack FA - {dataset_name}\n")
-                        f.write(f"# Extrait par IA GPT-4 Vision depuis l'image correspondante\n")
-                        f.write(f"# DÉTECTION AUTOMATIQUE PAR INTELLIGENCE ARTIFICIELLE\n")
-                        f.write(f"# Timestamp: {timestamp}\n")
-                        f.write(f"# Total éléments: {len(df)}\n\n")
-                        
-                        # Variables avec noms propres et cohérents
-                        var_name = f"{clean_dataset_name}_data"
-                        df_name = f"{clean_dataset_name}_df"
-                        
-                        f.write(f"{var_name} = {df_name} = pd.DataFrame([\n")
-                        
-                        for _, row in df.iterrows():
-                            f.write("    {")
-                            items = []
-                            for col in df.columns:
-                                value = row[col] if pd.notna(row[col]) else ""
-                                # Échapper les guillemets dans les valeurs
-                                escaped_value = str(value).replace('"', '\\"')
-                                items.append(f'"{col}": "{escaped_value}"')
-                            f.write(", ".join(items))
-                            f.write("},\n")
-                        
-                        f.write("])\n\n")
-                        
-                        # Ajouter des exemples d'utilisation
-                        f.write(f"# Utilisation:\n")
-                        f.write(f"# from flashback_dataframes.flashback_{clean_dataset_name}_data import {var_name}, {df_name}\n")
-                        f.write(f"# print({df_name}.head())\n")
-                        f.write(f"# print(f'{{len({df_name})}} éléments dans ce dataset')\n\n")
-                        
-                        # Statistiques du dataset
-                        f.write(f"# Statistiques du dataset:\n")
-                        f.write(f"# - Nombre d'éléments: {len(df)}\n")
-                        f.write(f"# - Colonnes: {list(df.columns)}\n")
-                        
-                        # Types de tableaux détectés
-                        if 'Table_Type' in df.columns:
-                            table_types = df['Table_Type'].value_counts().to_dict()
-                            f.write(f"# - Types détectés: {dict(table_types)}\n")
-                    
-                    logger.info(f"✅ '{dataset_name}' exporté vers {py_file}")
-                    logger.info(f"   📝 Variables: {var_name}, {df_name}")
-                    logger.info(f"   📊 {len(df)} éléments dans ce dataset")
+            # Écritures des fichiers en parallèle (E/S disque hors GIL)
+            exports = {name: df for name, df in dataframes.items() if not df.empty}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                py_files = list(executor.map(self.write_dataset, exports.keys(), exports.values(),
+                                             repeat(output_dir), repeat(timestamp)))
+            
+            for (dataset_name, df), py_file in zip(exports.items(), py_files):
+                clean_dataset_name = f"dataset_{dataset_name}"
+                var_name = f"{clean_dataset_name}_data"
+                df_name = f"{clean_dataset_name}_df"
+                logger.info(f"✅ '{dataset_name}' exporté vers {py_file}")
+                logger.info(f"   📝 Variables: {var_name}, {df_name}")
+                logger.info(f"   📊 {len(df)} éléments dans ce dataset")
             
             logger.info(f"📁 Tous les datasets exportés dans: {output_dir.absolute()}")
             logger.info(f"🎯 Organisation: 1 fichier Python = 1 image analysée")
@@ -486,6 +1521,15 @@ def clean_output_directory(output_dir: str = "flashback_dataframes"):
 
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Extraction IA des tableaux FlashBack FA")
+    parser.add_argument('--batch', action='store_true',
+                        help="Utiliser l'API Batch d'OpenAI (moins cher, résultats sous 24h) pour les gros volumes")
+    parser.add_argument('--images-per-request', type=int, default=1, metavar='N',
+                        help="Envoyer N images par appel GPT-4 Vision (prompt système partagé)")
+    parser.add_argument('--direct-http', action='store_true',
+                        help="Appeler l'API directement avec aiohttp plutôt que via le SDK OpenAI")
+    args = parser.parse_args()
+    
     print("🎮 FLASHBACK FA - EXTRACTEUR IA UNIVERSEL")
     print("🤖 ANALYSE PAR INTELLIGENCE ARTIFICIELLE GPT-4 VISION")
     print("📊 EXTRACTION DE TOUS LES TABLEAUX (armes, véhicules, objets, etc.)")
@@ -509,7 +1553,8 @@ def main():
     print(f"✅ Clé API OpenAI configurée (***{api_key[-6:]})")
     
     # Créer l'extracteur IA
-    ai_extractor = UniversalTableExtractorAI("flashback_images")
+    ai_extractor = UniversalTableExtractorAI("flashback_images", images_per_request=args.images_per_request,
+                                             direct_http=args.direct_http)
     
     # Vérifier le dossier d'images
     if not ai_extractor.images_dir.exists():
@@ -518,8 +1563,7 @@ def main():
         return
     
     # Compter les images
-    image_count = sum(1 for ext in ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp', '*.webp'] 
-                     for _ in ai_extractor.images_dir.glob(ext))
+    image_count = len(ai_extractor.list_image_files())
     
     if image_count == 0:
         print(f"❌ Aucune image trouvée dans {ai_extractor.images_dir}")
@@ -531,7 +1575,7 @@ def main():
     print("\n🤖 Analyse par intelligence artificielle...")
     print("🔍 GPT-4 Vision va analyser chaque image et extraire TOUS les tableaux")
     print("📊 Détection automatique: armes, véhicules, objets, immobilier, emplois, etc.")
-    dataframes_by_image = ai_extractor.process_all_images()
+    dataframes_by_image = ai_extractor.process_all_images(batch=args.batch)
     
     if dataframes_by_image:
         total_elements = sum(len(df) for df in dataframes_by_image.values())
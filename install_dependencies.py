@@ -28,11 +28,11 @@ def install_dependencies():
     # Dépendances de base (sans Pillow ni lxml)
     base_deps = [
         "requests==2.31.0",
-        "beautifulsoup4==4.12.2", 
         "aiohttp==3.9.1",
-        "aiofiles==23.2.1",
         "urllib3==2.1.0",
-        "tqdm==4.66.1"
+        "tqdm==4.66.1",
+        "imagesize==1.4.1",
+        "imagehash==4.3.1"
     ]
     
     print("📦 Installation des dépendances de base...")
@@ -59,7 +59,7 @@ def install_dependencies():
     
     if not lxml_installed:
         print("\n⚠️  ATTENTION: lxml n'a pas pu être installé!")
-        print("   Le scraper utilisera html.parser (plus lent mais fonctionnel)")
+        print("   Le scraper en a besoin pour analyser les pages HTML")
         print("   Alternatives pour lxml:")
         print("   1. Installer via conda: conda install lxml")
         print("   2. Utiliser WSL (Windows Subsystem for Linux)")
@@ -68,6 +68,9 @@ def install_dependencies():
     # Stratégies pour Pillow
     print("\n🖼️  Installation de Pillow...")
     pillow_strategies = [
+        # Remplaçant SIMD (JPEG/redimensionnement plus rapides): même espace de noms PIL que Pillow,
+        # qui doit être désinstallé d'abord (imagehash a pu l'installer en dépendance)
+        "pip uninstall -y Pillow && pip install pillow-simd",
         "pip install --only-binary=Pillow Pillow",  # Wheel pré-compilé
         "pip install Pillow==10.2.0",               # Version stable
         "pip install Pillow==9.5.0",                # Version plus ancienne
@@ -82,12 +85,16 @@ def install_dependencies():
             break
         print(f"   ❌ Échec, tentative suivante...")
     
+    if pillow_installed and "pillow-simd" in strategy:
+        print("   💡 pillow-simd remplace Pillow: ne relancez pas pip install -r requirements.txt,")
+        print("      qui réinstallerait Pillow par-dessus (même espace de noms PIL)")
+    
     if not pillow_installed:
         print("\n⚠️  ATTENTION: Pillow n'a pas pu être installé!")
         print("   Alternatives:")
         print("   1. Installer via conda: conda install pillow")
         print("   2. Télécharger wheel depuis: https://pypi.org/project/Pillow/#files")
-        print("   3. Le scraper fonctionnera mais sans validation d'images")
+        print("   3. Le scraper validera les images avec imagesize uniquement")
     
     print("\n" + "=" * 60)
     print("📋 VÉRIFICATION DES INSTALLATIONS")
@@ -95,8 +102,8 @@ def install_dependencies():
     
     # Vérifier les installations
     packages_to_check = [
-        "requests", "beautifulsoup4", "aiohttp", "aiofiles", 
-        "urllib3", "tqdm", "lxml", "PIL"
+        "requests", "aiohttp",
+        "urllib3", "tqdm", "imagesize", "imagehash", "lxml", "PIL"
     ]
     
     essential_working = True
@@ -111,21 +118,19 @@ def install_dependencies():
                 print(f"✅ {package}: {version}")
         except ImportError:
             print(f"❌ {package}: Non installé")
-            if package in ["requests", "beautifulsoup4", "aiohttp"]:
+            if package in ["requests", "aiohttp", "lxml"]:
                 essential_working = False
     
     print("\n" + "=" * 60)
     if essential_working:
         print("🎉 Installation terminée! Les composants essentiels sont installés.")
         print("💡 Vous pouvez maintenant lancer: python run_flashback.py")
-        if not lxml_installed:
-            print("⚠️  Note: lxml manquant, le parsing sera plus lent mais fonctionnel")
         if not pillow_installed:
             print("⚠️  Note: Pillow manquant, pas de validation d'images")
     else:
         print("❌ Installation incomplète. Composants essentiels manquants.")
         print("💡 Essayez: pip install --upgrade pip")
-        print("💡 Ou utilisez conda: conda install requests beautifulsoup4 aiohttp")
+        print("💡 Ou utilisez conda: conda install requests lxml aiohttp")
 
 if __name__ == "__main__":
     install_dependencies() 
\ No newline at end of file
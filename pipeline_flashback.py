@@ -6,26 +6,47 @@ Scraping des images + Extraction automatique des DataFrames par IA
 
 import os
 import sys
+import argparse
 import asyncio
+import importlib.util
 import time
 from pathlib import Path
 
+# (mtime, taille) du dernier .env chargé: un fichier inchangé n'est pas relu
+_env_cache = {}
+
 def load_env_file():
-    """Charge le fichier .env s'il existe"""
+    """Charge le fichier .env s'il existe (sans le relire s'il n'a pas changé)"""
     env_file = Path('.env')
-    if env_file.exists():
-        try:
-            with open(env_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        os.environ[key] = value
-        except Exception as e:
-            print(f"⚠️ Erreur lors du chargement du fichier .env: {e}")
+    try:
+        stat = env_file.stat()
+    except OSError:
+        return
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if _env_cache.get('signature') == signature:
+        return
+    
+    try:
+        # Lecture en une fois, variables ajoutées en un seul update
+        lines = (line.strip() for line in env_file.read_text(encoding='utf-8', errors='ignore').splitlines())
+        os.environ.update(
+            (key.strip(), value.strip())
+            for line in lines
+            if line and not line.startswith('#') and '=' in line
+            for key, value in [line.split('=', 1)]
+        )
+        _env_cache['signature'] = signature
+    except Exception as e:
+        print(f"⚠️ Erreur lors du chargement du fichier .env: {e}")
 
-async def run_scraper():
-    """Lance le scraper FlashBack FA"""
+async def run_scraper(image_queue: asyncio.Queue = None, session=None):
+    """
+    Lance le scraper FlashBack FA
+    
+    Args:
+        image_queue: File où publier les images sauvegardées (terminée par None) pour l'extraction IA
+        session: Session aiohttp partagée par toute la pipeline (sinon le scraper crée la sienne)
+    """
     print("🎯 ÉTAPE 1: SCRAPING DES IMAGES")
     print("=" * 50)
     
@@ -45,7 +66,9 @@ async def run_scraper():
             output_dir="flashback_images",
             max_concurrent=6,  # Respectueux avec Google Sites
             delay_between_requests=0.8,  # Plus lent mais plus sûr
-            timeout=60
+            timeout=60,
+            image_queue=image_queue,
+            session=session
         ) as scraper:
             stats = await scraper.crawl_flashback_site()
             
@@ -70,43 +93,67 @@ async def run_scraper():
     except Exception as e:
         print(f"❌ Erreur lors du scraping: {e}")
         return False
+    finally:
+        # Fin du flux d'images pour l'extracteur IA (y compris en cas d'échec)
+        if image_queue is not None:
+            await image_queue.put(None)
 
-def run_ai_extraction():
-    """Lance l'extraction IA des DataFrames"""
+async def drain_image_queue(image_queue: asyncio.Queue):
+    """Vide la file jusqu'à la sentinelle None pour ne pas bloquer le scraper"""
+    while await image_queue.get() is not None:
+        pass
+
+async def run_ai_extraction(image_queue: asyncio.Queue = None):
+    """
+    Lance l'extraction IA des DataFrames
+    
+    Args:
+        image_queue: File des images publiées par le scraper; sans file, analyse le dossier flashback_images
+    """
     print("\n🎯 ÉTAPE 2: EXTRACTION IA DES DATAFRAMES")
     print("=" * 50)
     
+    consuming = False
     try:
-        # Vérifier qu'on a des images
-        images_dir = Path("flashback_images")
-        if not images_dir.exists():
-            print("❌ Dossier 'flashback_images' non trouvé!")
-            return False
+        if image_queue is None:
+            # Vérifier qu'on a des images
+            images_dir = Path("flashback_images")
+            if not images_dir.exists():
+                print("❌ Dossier 'flashback_images' non trouvé!")
+                return False
         
-        # Compter les images
-        image_count = sum(1 for ext in ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp', '*.webp'] 
-                         for _ in images_dir.glob(ext))
+        # Importer l'extracteur IA
+        from image_to_dataframe import UniversalTableExtractorAI, list_image_files
         
-        if image_count == 0:
-            print(f"❌ Aucune image trouvée dans {images_dir}")
-            return False
-        
-        print(f"📷 {image_count} images trouvées pour analyse IA")
+        if image_queue is None:
+            # Compter les images
+            image_count = len(list_image_files(images_dir))
+            
+            if image_count == 0:
+                print(f"❌ Aucune image trouvée dans {images_dir}")
+                return False
+            
+            print(f"📷 {image_count} images trouvées pour analyse IA")
+        else:
+            print("📷 Images analysées au fil du scraping")
         print("🤖 GPT-4 Vision va analyser automatiquement tous les tableaux")
         print()
         
-        # Importer et lancer l'extracteur IA
-        from image_to_dataframe import UniversalTableExtractorAI
-        
-        ai_extractor = UniversalTableExtractorAI("flashback_images")
-        dataframes_by_type = ai_extractor.process_all_images()
+        # Lancer l'extracteur IA
+        async with UniversalTableExtractorAI("flashback_images") as ai_extractor:
+            if image_queue is None:
+                dataframes_by_type = await ai_extractor.aprocess_all_images()
+            else:
+                # aprocess_image_queue consomme la file jusqu'à la sentinelle, même en cas d'erreur
+                consuming = True
+                dataframes_by_type = await ai_extractor.aprocess_image_queue(image_queue)
         
         if dataframes_by_type:
             total_elements = sum(len(df) for df in dataframes_by_type.values())
             print(f"\n📊 {total_elements} éléments détectés dans {len(dataframes_by_type)} types de tableaux!")
             
-            # Exporter les DataFrames
-            ai_extractor.export_all_dataframes(dataframes_by_type)
+            # Exporter les DataFrames (écritures disque hors de la boucle asyncio)
+            await asyncio.to_thread(ai_extractor.export_all_dataframes, dataframes_by_type)
             print("✅ DataFrames exportés vers flashback_dataframes/")
             
             # Statistiques détaillées
@@ -114,7 +161,8 @@ def run_ai_extraction():
             for table_type, df in dataframes_by_type.items():
                 print(f"   📋 {table_type.capitalize()}: {len(df)} éléments")
                 if table_type == 'armes' and 'Type' in df.columns:
-                    type_counts = df['Type'].value_counts()
+                    # Comptage sans tri (ordre d'apparition dans le tableau)
+                    type_counts = df.groupby('Type', sort=False, observed=True).size()
                     for weapon_type, count in type_counts.items():
                         print(f"      - {weapon_type}: {count} armes")
             
@@ -131,15 +179,28 @@ def run_ai_extraction():
     except Exception as e:
         print(f"❌ Erreur lors de l'extraction IA: {e}")
         return False
+    finally:
+        # Extracteur indisponible: consommer la file pour que le scraper aille au bout
+        if image_queue is not None and not consuming:
+            await drain_image_queue(image_queue)
 
-def check_prerequisites():
-    """Vérifie que tous les prérequis sont remplis"""
+def check_prerequisites(deep_check: bool = False, scrape: bool = True, extract: bool = True,
+                        interactive: bool = True):
+    """
+    Vérifie que tous les prérequis sont remplis
+    
+    Args:
+        deep_check: Importer réellement chaque module (plus lent) au lieu de vérifier sa présence
+        scrape: Vérifier les prérequis du scraping
+        extract: Vérifier les prérequis de l'extraction IA (dont la clé API OpenAI)
+        interactive: Proposer la configuration de la clé API si elle manque (sinon échec direct)
+    """
     print("🔍 VÉRIFICATION DES PRÉREQUIS")
     print("=" * 40)
     
     # Vérifier la clé API OpenAI
     api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
+    if extract and not api_key:
         print("❌ Clé API OpenAI non configurée!")
         print()
         print("🔧 Solutions:")
@@ -149,13 +210,17 @@ def check_prerequisites():
         print()
         print("💡 Obtenez votre clé API sur: https://platform.openai.com/api-keys")
         
+        # Mode non interactif (--yes): la configuration demanderait une saisie
+        if not interactive:
+            return False
+        
         # Proposer de lancer la configuration
         choice = input("Voulez-vous configurer maintenant ? (O/n): ").lower()
         if choice not in ['n', 'non', 'no']:
             print()
-            os.system("python setup_openai.py")
-            # Recharger après configuration
-            load_env_file()
+            # Configuration dans ce processus: la clé est aussitôt visible dans os.environ
+            from setup_openai import setup_openai_api
+            setup_openai_api()
             api_key = os.getenv('OPENAI_API_KEY')
             if not api_key:
                 print("❌ Configuration échouée")
@@ -163,25 +228,37 @@ def check_prerequisites():
         else:
             return False
     
-    print(f"✅ Clé API OpenAI configurée (***{api_key[-6:]})")
+    if extract:
+        print(f"✅ Clé API OpenAI configurée (***{api_key[-6:]})")
     
-    # Vérifier les modules requis
+    # Vérifier les modules requis par les étapes lancées
     missing_modules = []
     required_modules = [
-        ('aiohttp', 'aiohttp'),
-        ('aiofiles', 'aiofiles'),
-        ('beautifulsoup4', 'bs4'),
-        ('pandas', 'pandas'),
-        ('openai', 'openai'),
-        ('pillow', 'PIL'),
-        ('tqdm', 'tqdm')
+        ('aiohttp', 'aiohttp', scrape),
+        ('lxml', 'lxml', scrape),
+        ('pandas', 'pandas', extract),
+        ('openai', 'openai', extract),
+        ('pillow', 'PIL', extract),
+        ('tqdm', 'tqdm', scrape)
     ]
     
-    for module_name, import_name in required_modules:
-        try:
-            __import__(import_name)
+    for module_name, import_name, needed in required_modules:
+        if not needed:
+            continue
+        
+        # find_spec localise le module sans exécuter son __init__ (pandas/openai/PIL sont lourds à importer)
+        if deep_check:
+            try:
+                __import__(import_name)
+                found = True
+            except ImportError:
+                found = False
+        else:
+            found = importlib.util.find_spec(import_name) is not None
+        
+        if found:
             print(f"✅ {module_name}")
-        except ImportError:
+        else:
             missing_modules.append(module_name)
             print(f"❌ {module_name}")
     
@@ -193,9 +270,16 @@ def check_prerequisites():
     print("✅ Tous les modules requis sont installés")
     return True
 
-async def main():
-    """Pipeline principale"""
+async def main(args: argparse.Namespace):
+    """
+    Pipeline principale
+    
+    Args:
+        args: Options de la ligne de commande (voir parse_args)
+    """
     start_time = time.time()
+    scrape = not args.extract_only
+    extract = not args.scrape_only
     
     print("🎮 FLASHBACK FA - PIPELINE COMPLÈTE")
     print("🤖 SCRAPING + EXTRACTION IA AUTOMATIQUE")
@@ -205,8 +289,11 @@ async def main():
     # Charger les variables d'environnement
     load_env_file()
     
-    # Vérifier les prérequis
-    if not check_prerequisites():
+    # Vérifier les prérequis dans un thread: ses saisies (et setup_openai_api) ne bloquent pas la boucle
+    prerequisites_ok = await asyncio.to_thread(
+        check_prerequisites, args.deep_check, scrape=scrape, extract=extract, interactive=not args.yes
+    )
+    if not prerequisites_ok:
         print("\n❌ Prérequis non remplis. Veuillez corriger avant de continuer.")
         return
     
@@ -214,30 +301,54 @@ async def main():
     
     # Demander confirmation
     print("\n📋 Cette pipeline va:")
-    print("   1. 🕷️  Scraper toutes les images du site FlashBack FA")
-    print("   2. 🤖 Analyser les images avec GPT-4 Vision")
-    print("   3. 📊 Extraire automatiquement tous les tableaux")
-    print("   4. 💾 Générer les DataFrames dans flashback_dataframes/")
+    if scrape:
+        print("   🕷️  Scraper toutes les images du site FlashBack FA")
+    if extract:
+        print("   🤖 Analyser les images avec GPT-4 Vision")
+        print("   📊 Extraire automatiquement tous les tableaux")
+        print("   💾 Générer les DataFrames dans flashback_dataframes/")
     print()
     
-    choice = input("Voulez-vous continuer ? (O/n): ").lower()
-    if choice in ['n', 'non', 'no']:
-        print("Pipeline annulée.")
-        return
+    if not args.yes:
+        # Saisie dans un thread: la boucle d'événements n'est pas bloquée sur stdin
+        choice = await asyncio.get_running_loop().run_in_executor(None, input, "Voulez-vous continuer ? (O/n): ")
+        if choice.lower() in ['n', 'non', 'no']:
+            print("Pipeline annulée.")
+            return
     
     print("\n" + "="*60)
     
-    # ÉTAPE 1: Scraping
-    scraping_success = await run_scraper()
-    
-    if not scraping_success:
-        print("\n❌ Échec du scraping. Pipeline interrompue.")
-        return
+    # Étape non lancée: None (absente du résumé)
+    scraping_success = extraction_success = None
     
-    print("\n" + "="*60)
+    if not scrape:
+        # Extraction seule: images déjà présentes dans flashback_images (aiohttp jamais importé)
+        extraction_success = await run_ai_extraction()
+    else:
+        # Une seule session HTTP pour toute la pipeline: connexions TCP/TLS et cache DNS réutilisés
+        import aiohttp
+        from config import create_connector, get_config
+        
+        # Pool keep-alive et cache DNS dimensionnés par config.py (SSL non vérifié pour Google Sites)
+        connector = create_connector(get_config(), ssl=False)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            if not extract:
+                # Scraping seul: ni pandas ni openai ne sont importés
+                scraping_success = await run_scraper(session=session)
+            else:
+                # ÉTAPES 1 et 2 en parallèle: chaque image sauvegardée part aussitôt à l'extraction IA.
+                # File bornée: si l'extraction IA prend du retard, le scraper attend au lieu d'empiler les images
+                image_queue = asyncio.Queue(maxsize=32)
+                scraping_success, extraction_success = await asyncio.gather(
+                    run_scraper(image_queue, session),
+                    run_ai_extraction(image_queue)
+                )
     
-    # ÉTAPE 2: Extraction IA
-    extraction_success = run_ai_extraction()
+    stage_results = [
+        (name, success)
+        for name, success in (("Scraping", scraping_success), ("Extraction IA", extraction_success))
+        if success is not None
+    ]
     
     # Résumé final
     end_time = time.time()
@@ -248,26 +359,38 @@ async def main():
     print("="*60)
     print(f"⏱️  Durée totale: {duration:.2f} secondes")
     
-    if scraping_success and extraction_success:
+    if all(success for _, success in stage_results):
         print("✅ Succès complet!")
         print("📁 Résultats disponibles dans:")
         print("   📷 flashback_images/ (images scrapées)")
-        print("   📊 flashback_dataframes/ (DataFrames générés)")
-        print()
-        print("🎯 Vous pouvez maintenant utiliser les DataFrames:")
-        print("   from flashback_dataframes.flashback_armes_data import armes_df")
+        if extract:
+            print("   📊 flashback_dataframes/ (DataFrames générés)")
+            print()
+            print("🎯 Vous pouvez maintenant utiliser les DataFrames:")
+            print("   from flashback_dataframes.flashback_armes_data import armes_df")
     else:
         print("⚠️  Pipeline partiellement réussie")
-        if scraping_success:
-            print("✅ Scraping: OK")
-        else:
-            print("❌ Scraping: Échec")
-        if extraction_success:
-            print("✅ Extraction IA: OK")
-        else:
-            print("❌ Extraction IA: Échec")
+        for name, success in stage_results:
+            print(f"✅ {name}: OK" if success else f"❌ {name}: Échec")
     
     print("="*60)
 
+def parse_args() -> argparse.Namespace:
+    """Options de la ligne de commande de la pipeline"""
+    parser = argparse.ArgumentParser(description="Pipeline FlashBack FA: scraping des images + extraction IA des DataFrames")
+    stage = parser.add_mutually_exclusive_group()
+    stage.add_argument('--scrape-only', action='store_true',
+                       help="Scraper les images sans lancer l'extraction IA")
+    stage.add_argument('--extract-only', action='store_true',
+                       help="Analyser les images déjà présentes dans flashback_images, sans scraping")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="Ne poser aucune question (exécutions automatisées: CI, cron)")
+    parser.add_argument('--deep-check', action='store_true',
+                        help="Importer réellement les modules requis lors de la vérification des prérequis")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    args = parse_args()
+    from config import get_config, install_event_loop_policy
+    install_event_loop_policy(get_config().io_backend)
+    asyncio.run(main(args)) 
\ No newline at end of file
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Limiteur de débit adaptatif par hôte (token bucket)
+Augmente progressivement le débit tant que le TTFB reste stable et le réduit en cas d'erreurs
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Écart de TTFB (secondes) en dessous duquel une hausse est considérée comme du bruit
+TTFB_JITTER_S = 0.05
+
+# Nombre minimal de résultats dans la fenêtre avant de juger le taux d'erreurs
+MIN_BACKOFF_SAMPLES = 10
+
+
+class _HostBucket:
+    """État du token bucket d'un hôte"""
+    __slots__ = ('rate', 'tokens', 'last_refill', 'crawl_delay', 'last_failure', 'ttfb_avg',
+                 'ramp_successes', 'consecutive_failures', 'outcomes', 'last_backoff')
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.crawl_delay = 0.0
+        self.last_failure: Optional[float] = None
+        self.ttfb_avg: Optional[float] = None
+        self.ramp_successes = 0
+        self.consecutive_failures = 0
+        self.outcomes = deque()  # (timestamp, succès)
+        self.last_backoff: Optional[float] = None
+
+
+class HostRateLimiter:
+    def __init__(self,
+                 min_interval: float = 0.0,
+                 initial_tokens: float = 1,
+                 max_tokens: float = 32,
+                 ramp_factor: float = 1.5,
+                 backoff_on_error_rate: float = 0.1,
+                 backoff_window_s: float = 60,
+                 ttfb_degradation_threshold: float = 1.5,
+                 max_consecutive_failures: int = 50):
+        """
+        Token bucket par hôte avec ajustement du débit par hill-climbing
+
+        Args:
+            min_interval: Délai minimal entre deux requêtes vers un hôte qui a récemment
+                échoué (429/5xx/timeout dans la fenêtre backoff_window_s)
+            initial_tokens: Débit initial (requêtes/seconde)
+            max_tokens: Débit maximal (requêtes/seconde)
+            ramp_factor: Facteur d'augmentation du débit quand le TTFB est stable
+            backoff_on_error_rate: Taux d'erreurs déclenchant la division du débit par 2
+                (au plus une fois par fenêtre, sur au moins MIN_BACKOFF_SAMPLES résultats)
+            backoff_window_s: Fenêtre glissante de calcul du taux d'erreurs (secondes)
+            ttfb_degradation_threshold: Ratio TTFB/moyenne au-delà duquel on ralentit
+            max_consecutive_failures: Nombre d'échecs consécutifs avant abandon de l'hôte
+        """
+        self.min_interval = min_interval
+        self.initial_tokens = initial_tokens
+        self.max_tokens = max_tokens
+        self.ramp_factor = ramp_factor
+        self.backoff_on_error_rate = backoff_on_error_rate
+        self.backoff_window_s = backoff_window_s
+        self.ttfb_degradation_threshold = ttfb_degradation_threshold
+        self.max_consecutive_failures = max_consecutive_failures
+
+        self._buckets: Dict[str, _HostBucket] = {}
+
+    def _bucket(self, host: str) -> _HostBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = _HostBucket(self.initial_tokens)
+            self._buckets[host] = bucket
+        return bucket
+
+    def _in_backoff(self, bucket: _HostBucket) -> bool:
+        return (bucket.last_failure is not None
+                and time.monotonic() - bucket.last_failure < self.backoff_window_s)
+
+    def _max_rate(self, bucket: _HostBucket) -> float:
+        # Le Crawl-delay s'applique toujours, min_interval seulement après un échec récent
+        interval = bucket.crawl_delay
+        if self._in_backoff(bucket):
+            interval = max(interval, self.min_interval)
+        if interval > 0:
+            return min(self.max_tokens, 1.0 / interval)
+        return self.max_tokens
+
+    def set_crawl_delay(self, host: str, delay: float):
+        """Applique un Crawl-delay (robots.txt) comme plancher pour un hôte"""
+        bucket = self._bucket(host)
+        bucket.crawl_delay = max(bucket.crawl_delay, delay)
+        bucket.rate = min(bucket.rate, self._max_rate(bucket))
+
+    def is_blocked(self, host: str) -> bool:
+        """Indique si l'hôte a été abandonné après trop d'échecs consécutifs"""
+        bucket = self._buckets.get(host)
+        return bucket is not None and bucket.consecutive_failures >= self.max_consecutive_failures
+
+    async def acquire(self, host: str) -> bool:
+        """
+        Attend qu'un jeton soit disponible pour l'hôte
+
+        Returns:
+            bool: False si l'hôte est abandonné (trop d'échecs consécutifs)
+        """
+        bucket = self._bucket(host)
+
+        while True:
+            if self.is_blocked(host):
+                return False
+
+            now = time.monotonic()
+            rate = min(bucket.rate, self._max_rate(bucket))
+            capacity = max(1.0, rate)
+            bucket.tokens = min(capacity, bucket.tokens + (now - bucket.last_refill) * rate)
+            bucket.last_refill = now
+
+            # Pas d'await entre le test et la décrémentation: opération atomique pour asyncio
+            if bucket.tokens >= 1.0:
+                bucket.tokens -= 1.0
+                return True
+
+            await asyncio.sleep((1.0 - bucket.tokens) / rate)
+
+    def _record(self, bucket: _HostBucket, success: bool) -> float:
+        """Enregistre un résultat et retourne le taux d'erreurs sur la fenêtre"""
+        now = time.monotonic()
+        bucket.outcomes.append((now, success))
+        while bucket.outcomes and now - bucket.outcomes[0][0] > self.backoff_window_s:
+            bucket.outcomes.popleft()
+
+        errors = sum(1 for _, ok in bucket.outcomes if not ok)
+        return errors / len(bucket.outcomes)
+
+    def record_success(self, host: str, ttfb: float):
+        """Enregistre une réponse réussie et augmente le débit si le TTFB est stable"""
+        bucket = self._bucket(host)
+        bucket.consecutive_failures = 0
+        self._record(bucket, True)
+
+        if bucket.ttfb_avg is None:
+            bucket.ttfb_avg = ttfb
+            return
+
+        if (ttfb > bucket.ttfb_avg * self.ttfb_degradation_threshold
+                and ttfb - bucket.ttfb_avg > TTFB_JITTER_S):
+            # Le serveur ralentit: on réduit le débit d'un cran
+            bucket.rate = max(1.0 / self.backoff_window_s, bucket.rate / self.ramp_factor)
+            bucket.ramp_successes = 0
+        else:
+            # Une montée en débit par "seconde" de trafic au débit courant
+            bucket.ramp_successes += 1
+            if bucket.ramp_successes >= math.ceil(bucket.rate):
+                bucket.rate = min(self._max_rate(bucket), bucket.rate * self.ramp_factor)
+                bucket.ramp_successes = 0
+
+        bucket.ttfb_avg = 0.8 * bucket.ttfb_avg + 0.2 * ttfb
+
+    def record_failure(self, host: str):
+        """Enregistre un échec (429/5xx/timeout) et divise le débit par 2 si nécessaire"""
+        bucket = self._bucket(host)
+        bucket.consecutive_failures += 1
+        bucket.ramp_successes = 0
+        now = bucket.last_failure = time.monotonic()
+        error_rate = self._record(bucket, False)
+
+        # Fenêtre conservée: sans échantillon suffisant, un seul échec vaudrait 100 % d'erreurs
+        if len(bucket.outcomes) < MIN_BACKOFF_SAMPLES or error_rate < self.backoff_on_error_rate:
+            return
+        if bucket.last_backoff is not None and now - bucket.last_backoff < self.backoff_window_s:
+            return
+
+        bucket.rate = max(1.0 / self.backoff_window_s, bucket.rate / 2)
+        bucket.last_backoff = now
@@ -4,9 +4,14 @@ Script de configuration de la clé API OpenAI pour l'extracteur d'armes FlashBac
 """
 
 import os
+import re
+import stat
 import sys
 from pathlib import Path
 
+# Lignes OPENAI_API_KEY=... d'un fichier .env (remplacées à chaque configuration)
+_API_KEY_LINE_RE = re.compile(r'^OPENAI_API_KEY=.*(?:\n|$)', re.M)
+
 def setup_openai_api():
     """Configure la clé API OpenAI"""
     print("🔑 CONFIGURATION API OPENAI")
@@ -45,22 +50,31 @@ def setup_openai_api():
     env_file = Path('.env')
     
     try:
-        # Lire le fichier existant
+        # Lire le fichier existant et retirer les lignes OPENAI_API_KEY existantes
+        # (droits conservés; nouveau fichier lisible par son seul propriétaire: il contient la clé)
         env_content = ""
+        env_mode = 0o600
         if env_file.exists():
-            with open(env_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # Filtrer les lignes OPENAI_API_KEY existantes
-            filtered_lines = [line for line in lines if not line.startswith('OPENAI_API_KEY=')]
-            env_content = ''.join(filtered_lines)
+            env_content = env_file.read_text(encoding='utf-8')
+            env_mode = stat.S_IMODE(env_file.stat().st_mode)
+        env_content = _API_KEY_LINE_RE.sub('', env_content)
+        if env_content and not env_content.endswith('\n'):
+            env_content += '\n'
         
         # Ajouter la nouvelle clé
         env_content += f"OPENAI_API_KEY={api_key}\n"
         
-        # Écrire le fichier
-        with open(env_file, 'w', encoding='utf-8') as f:
-            f.write(env_content)
+        # Écrire le fichier (fichier temporaire puis renommage: jamais de .env à moitié écrit)
+        tmp_file = env_file.with_name(f".env.{os.getpid()}.tmp")
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, env_mode)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(env_content)
+            os.replace(tmp_file, env_file)
+        except BaseException:
+            # Ne jamais laisser traîner une copie de la clé
+            tmp_file.unlink(missing_ok=True)
+            raise
         
         print(f"✅ Clé API sauvegardée dans {env_file}")
         
@@ -83,8 +97,13 @@ def setup_openai_api():
         else:  # Unix/Linux/Mac
             print(f"   export OPENAI_API_KEY={api_key}")
 
-def test_openai_connection():
-    """Teste la connexion à l'API OpenAI"""
+def test_openai_connection(deep: bool = False):
+    """
+    Teste la connexion à l'API OpenAI
+    
+    Args:
+        deep: Faire aussi un vrai appel chat.completions (payant) en plus de la liste des modèles
+    """
     try:
         from openai import OpenAI
         
@@ -97,16 +116,20 @@ def test_openai_connection():
         
         client = OpenAI(api_key=api_key)
         
-        # Test simple avec GPT-3.5
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "Hello"}],
-            max_tokens=5
-        )
-        
+        # Liste des modèles: valide la clé en un seul appel, gratuit (aucun token consommé)
+        models = client.models.list()
         print("✅ Connexion API réussie!")
-        print(f"   Modèle utilisé: {response.model}")
-        print(f"   Réponse: {response.choices[0].message.content}")
+        print(f"   Modèles accessibles: {len(models.data)}")
+        
+        if deep:
+            # Test complet avec GPT-3.5
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": "Hello"}],
+                max_tokens=5
+            )
+            print(f"   Modèle utilisé: {response.model}")
+            print(f"   Réponse: {response.choices[0].message.content}")
         return True
         
     except ImportError:
@@ -119,7 +142,8 @@ def test_openai_connection():
 def main():
     """Fonction principale"""
     if len(sys.argv) > 1 and sys.argv[1] == 'test':
-        test_openai_connection()
+        # python setup_openai.py test [--deep]
+        test_openai_connection(deep='--deep' in sys.argv[2:])
     else:
         setup_openai_api()
 